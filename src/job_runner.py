@@ -3,10 +3,21 @@ import os
 import sys
 import time
 import random
+import queue
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from types import SimpleNamespace
 from dotenv import load_dotenv
-from pipeline import process_pipeline
+from pipeline import (
+    process_pipeline, process_group, prepare_job, render_job, deliver_job,
+    abandon_workdir, is_delivered, SHORTS_DIR
+)
+from utils import concurrency, notify_queue, job_store, progress, metrics
+from utils.helpers import to_seconds
+from utils.ffmpeg_runner import FFmpegError
+from utils.scheduler import SlotScheduler, parse_slot_time, next_midnight
 from pathlib import Path
 
 # Load environment variables
@@ -20,9 +31,21 @@ JSON_FILE = DATA_DIR / "_jobs.json"
 # Load configuration from environment
 MIN_DELAY = int(os.getenv("MIN_DELAY", "30"))          
 MAX_DELAY = int(os.getenv("MAX_DELAY", "60"))         
-CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "30"))
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
 
+# Slot execution: "sequential" runs items one by one, "pool" dispatches them
+# to WORKERS processes (stage limits live in utils/concurrency.py), "staged"
+# overlaps prepare/render/upload of consecutive items through bounded queues
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "sequential").lower()
+WORKERS = int(os.getenv("WORKERS", str(os.cpu_count() or 1)))
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "1"))
+JOBS_WORK_DIR = SHORTS_DIR / "jobs"
+
+# Items of a slot cut from the same source are rendered in one decode pass,
+# as long as their ranges are no more than GROUP_MAX_GAP seconds apart
+GROUP_RENDER = os.getenv("GROUP_RENDER", "1") == "1"
+GROUP_MAX_GAP = float(os.getenv("GROUP_MAX_GAP", "300"))
+
 # Proxy configuration
 PROXIES_STR = os.getenv("PROXIES", "")
 PROXIES = [p.strip() for p in PROXIES_STR.split(",") if p.strip()] if PROXIES_STR else []
@@ -35,18 +58,6 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 TELEGRAM_API_ID = os.getenv("TELEGRAM_API_ID")
 TELEGRAM_API_HASH = os.getenv("TELEGRAM_API_HASH")
 
-def load_jobs(path):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: {path} not found.")
-        return []
-
-def save_jobs(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
 def print_daily_summary(schedule):
     os.system('cls' if os.name == 'nt' else 'clear')
     
@@ -76,7 +87,28 @@ def get_next_proxy():
     proxy_index = (proxy_index + 1) % len(PROXIES)
     return proxy
 
-def normalize_job(job, proxy):
+def slot_key(slot_time):
+    return slot_time.replace(",", "_").replace(":", "")
+
+def job_workdir(slot_time, index, job):
+    """Deterministic per-item working directory so outputs never collide."""
+    digest = hashlib.sha1(json.dumps(job, sort_keys=True).encode("utf-8")).hexdigest()[:10]
+    return JOBS_WORK_DIR / f"{slot_key(slot_time)}_{index:02d}_{digest}"
+
+def skip_delivered(i, total, workdir):
+    """True (and counted as done) if the item was delivered before a runner restart."""
+    if not is_delivered(workdir):
+        return False
+    print(f"\n[SKIP] Item {i}/{total} was already delivered")
+    progress.slot_item_done()
+    return True
+
+def clear_delivered(slot_time):
+    """Drop the slot's delivered markers once the whole slot is marked completed."""
+    for marker in JOBS_WORK_DIR.glob(f"{slot_key(slot_time)}_*.delivered"):
+        marker.unlink(missing_ok=True)
+
+def normalize_job(job, proxy, workdir=None):
     return SimpleNamespace(
         url=job.get("url"),
         local=job.get("local"),
@@ -87,11 +119,13 @@ def normalize_job(job, proxy):
         description=job.get("description", ""),
         account=job.get("account", "random"),
         model=job.get("model", "small"),
+        transcribe_mode=job.get("transcribe_mode"),
         subs=job.get("subs", True),
         crop=job.get("crop", True),
         tests=job.get("tests", False),
         brainrot=job.get("brainrot", False),
-        proxy=proxy
+        proxy=proxy,
+        workdir=workdir
     )
 
 def send_telegram_notification(title, account, platform, link=None):
@@ -99,33 +133,287 @@ def send_telegram_notification(title, account, platform, link=None):
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
         return False
     
+    text = (
+        f"<b>Title:</b> {title}\n"
+        f"<b>Account:</b> {account}\n"
+        f"<b>Platform:</b> {platform}"
+    )
+    
+    if link:
+        text += f"\n<b>Link:</b> {link}"
+
+    # Delivered by the notify_queue dispatcher, never blocks the slot
+    queued = notify_queue.enqueue(text, TELEGRAM_CHAT_ID)
+    if queued:
+        print(f"\n[INFO] Telegram notification queued for {platform}")
+    return queued
+
+def notify_job_done(job):
+    # Send Telegram notification on success
+    job_title = job.get("title", "Unknown")
+    job_account = job.get("account", "Unknown")
+    send_telegram_notification(job_title, job_account, "Video Processing")
+
+def group_jobs(items):
+    """
+    Split slot items into groups sharing one source whose clip ranges lie
+    within GROUP_MAX_GAP of each other. Returns lists of (index, job),
+    ordered by the first item of each group.
+    """
+    by_source = {}
+    for i, job in enumerate(items, 1):
+        key = ("local", job["local"]) if job.get("local") else ("url", job.get("url"))
+        by_source.setdefault(key, []).append((i, job))
+
+    groups = []
+    for members in by_source.values():
+        members.sort(key=lambda m: to_seconds(m[1]["start"]))
+        current, current_end = [], None
+        for i, job in members:
+            start = to_seconds(job["start"])
+            if current and start - current_end > GROUP_MAX_GAP:
+                groups.append(current)
+                current = []
+            if not current:
+                current_end = to_seconds(job["end"])
+            current.append((i, job))
+            current_end = max(current_end, to_seconds(job["end"]))
+        groups.append(current)
+
+    return sorted(groups, key=lambda g: min(i for i, _ in g))
+
+def run_group(slot_time, group, total):
+    """Render a group of same-source items together; failed items fall back to run_job."""
+    group = [(i, job) for i, job in group if not skip_delivered(i, total, job_workdir(slot_time, i, job))]
+    if len(group) == 1:
+        i, job = group[0]
+        print(f"\n--- Item {i}/{total} ---")
+        run_job(job, job_workdir(slot_time, i, job))
+        return
+    if not group:
+        return
+    labels = ", ".join(str(i) for i, _ in group)
+    print(f"\n--- Items {labels}/{total} (shared source) ---")
+
+    current_proxy = get_next_proxy()
+    if current_proxy:
+        print(f"[PROXY] Using: {current_proxy}")
+
+    workdirs = [job_workdir(slot_time, i, job) for i, job in group]
+    args_list = [
+        normalize_job(job, current_proxy, workdir)
+        for (_, job), workdir in zip(group, workdirs)
+    ]
     try:
-        import requests
-        
-        text = (
-            f"<b>Title:</b> {title}\n"
-            f"<b>Account:</b> {account}\n"
-            f"<b>Platform:</b> {platform}"
-        )
-        
-        if link:
-            text += f"\n<b>Link:</b> {link}"
-        
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
+        results = process_group(args_list)
+    except Exception as e:
+        print(f"[FAILED] Grouped render: {e}")
+        print("[INFO] Falling back to per-item processing")
+        results = [(None, e)] * len(group)
+
+    for (i, job), workdir, (ctx, error) in zip(group, workdirs, results):
+        if error is None:
+            notify_job_done(job)
+            metrics.inc("clip_jobs_total", status="success")
+            progress.slot_item_done()
+        elif ctx is not None:
+            # Rendered by the group; only the delivery needs another go
+            print(f"\n--- Item {i}/{total} (retry delivery) ---")
+            run_job(job, workdir, rendered=ctx)
+        else:
+            print(f"\n--- Item {i}/{total} (retry alone) ---")
+            run_job(job, workdir)
+
+def run_job(job, workdir=None, rendered=None):
+    """
+    Run one item through the pipeline with retries. Returns True on success.
+    rendered is the context of an item whose video already exists (from a
+    group render); then only its delivery is retried.
+    """
+    retry_count = 0
+    success = False
+    
+    while retry_count <= MAX_RETRIES and not success:
+        try:
+            if rendered:
+                deliver_job(rendered)
+            else:
+                current_proxy = get_next_proxy()
+                if current_proxy:
+                    print(f"[PROXY] Using: {current_proxy}")
+
+                args_obj = normalize_job(job, current_proxy, workdir)
+                process_pipeline(args_obj)
+            success = True
+            notify_job_done(job)
+            
+        except Exception as e:
+            retry_count += 1
+            metrics.inc("clip_job_retries_total")
+            print(f"[FAILED] Attempt {retry_count}/{MAX_RETRIES}: {e}")
+            if isinstance(e, FFmpegError) and not e.retriable:
+                # Same local input and filters would fail the same way again
+                print("[FAILED] ffmpeg failed on local input, not retrying")
+                break
+            if retry_count <= MAX_RETRIES:
+                wait_time = random.randint(5, 15)
+                print(f"Retrying in {wait_time}s...")
+                time.sleep(wait_time)
+    
+    if not success:
+        print(f"[FAILED] Job failed after {MAX_RETRIES} attempts")
+        if workdir:
+            abandon_workdir(workdir)
+    metrics.inc("clip_jobs_total", status="success" if success else "failed")
+    # Pool workers exit without running atexit handlers
+    metrics.flush()
+    # No-op in pool workers, whose slot init_pool_worker cleared
+    progress.slot_item_done()
+    return success
+
+def init_pool_worker(semaphores):
+    global proxy_index
+    concurrency.init_worker(semaphores)
+    notify_queue.disable_dispatch()
+    progress.disable_terminal()
+    # The slot is the parent's to report; it counts finished futures
+    progress.end_slot()
+    # Spread workers over the proxy list instead of all starting at the first one
+    if PROXIES:
+        proxy_index = os.getpid() % len(PROXIES)
+
+def run_slot_sequential(slot_time, items):
+    total = len(items)
+    if GROUP_RENDER:
+        groups = group_jobs(items)
+    else:
+        groups = [[(i, job)] for i, job in enumerate(items, 1)]
+
+    for n, group in enumerate(groups, 1):
+        if len(group) > 1:
+            run_group(slot_time, group, total)
+        else:
+            i, job = group[0]
+            if skip_delivered(i, total, job_workdir(slot_time, i, job)):
+                continue
+            print(f"\n--- Item {i}/{total} ---")
+            run_job(job, job_workdir(slot_time, i, job))
         
-        payload = {
-            "chat_id": TELEGRAM_CHAT_ID, 
-            "text": text,
-            "parse_mode": "HTML"
+        if n < len(groups):
+            wait_time = random.randint(MIN_DELAY, MAX_DELAY)
+            print(f"Waiting {wait_time}s before next job...")
+            time.sleep(wait_time)
+
+def run_slot_pool(slot_time, items):
+    total = len(items)
+    workers = max(1, min(WORKERS, total))
+    print(f"[INFO] Dispatching {total} item(s) to {workers} worker(s)")
+    
+    semaphores = concurrency.create_semaphores()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=concurrency.POOL_CONTEXT,
+        initializer=init_pool_worker,
+        initargs=(semaphores,)
+    ) as pool:
+        futures = {
+            pool.submit(run_job, job, job_workdir(slot_time, i, job)): i
+            for i, job in enumerate(items, 1)
+            if not skip_delivered(i, total, job_workdir(slot_time, i, job))
         }
+        for future in futures:
+            i = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                ok = False
+                print(f"[FAILED] Item {i}/{total} crashed its worker: {e}")
+            progress.slot_item_done()
+            print(f"[{'DONE' if ok else 'FAILED'}] Item {i}/{total}")
 
-        response = requests.post(url, data=payload, timeout=24)
-        response.raise_for_status()
-        print(f"\n[SUCCESS] Telegram notification sent for {platform}")
-        return True
-    except Exception as e:
-        print(f"\n[ERROR] Failed to send to Telegram: {e}")
-        return False
+def run_slot_staged(slot_time, items):
+    """
+    Producer/consumer pipeline over the slot: item N+1 downloads and
+    transcribes while item N renders, and item N uploads while item N+1
+    renders. Bounded queues make a fast stage wait for a slow one. Items that
+    fail in any stage are retried afterwards with run_job, which resumes from
+    their checkpoints.
+    """
+    total = len(items)
+    render_q = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    upload_q = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    metrics.register_gauge("clip_queue_depth", render_q.qsize, queue="render")
+    metrics.register_gauge("clip_queue_depth", upload_q.qsize, queue="upload")
+    failed = []
+
+    def fail(i, job, stage, e):
+        print(f"\n[FAILED] Item {i}/{total} in {stage}: {e}")
+        failed.append((i, job))
+
+    def prepare_stage():
+        for i, job in enumerate(items, 1):
+            if skip_delivered(i, total, job_workdir(slot_time, i, job)):
+                continue
+            print(f"\n--- Item {i}/{total} (prepare) ---")
+            try:
+                args_obj = normalize_job(job, get_next_proxy(), job_workdir(slot_time, i, job))
+                render_q.put((i, job, prepare_job(args_obj)))
+            except Exception as e:
+                fail(i, job, "prepare", e)
+        render_q.put(None)
+
+    def render_stage():
+        while True:
+            entry = render_q.get()
+            if entry is None:
+                upload_q.put(None)
+                return
+            i, job, ctx = entry
+            try:
+                render_job(ctx)
+                upload_q.put(entry)
+            except Exception as e:
+                fail(i, job, "render", e)
+
+    def upload_stage():
+        while True:
+            entry = upload_q.get()
+            if entry is None:
+                return
+            i, job, ctx = entry
+            try:
+                deliver_job(ctx)
+                notify_job_done(job)
+                metrics.inc("clip_jobs_total", status="success")
+                progress.slot_item_done()
+                print(f"\n[DONE] Item {i}/{total}")
+            except Exception as e:
+                fail(i, job, "upload", e)
+
+    threads = [
+        threading.Thread(target=stage, name=f"slot-{stage.__name__}", daemon=True)
+        for stage in (prepare_stage, render_stage, upload_stage)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for i, job in sorted(failed, key=lambda f: f[0]):
+        print(f"\n--- Item {i}/{total} (retry) ---")
+        run_job(job, job_workdir(slot_time, i, job))
+
+def execute_slot(slot_time, items):
+    progress.start_slot(slot_time, len(items))
+    try:
+        if EXECUTION_MODE == "pool" and len(items) > 1:
+            run_slot_pool(slot_time, items)
+        elif EXECUTION_MODE == "staged" and len(items) > 1:
+            run_slot_staged(slot_time, items)
+        else:
+            run_slot_sequential(slot_time, items)
+    finally:
+        progress.end_slot()
 
 def main():
     last_reported_date = None
@@ -134,68 +422,53 @@ def main():
     else:
         print("[INFO] Starting job runner without proxy (PROXIES not configured)")
     print(f"[INFO] Telegram notifications: {'Enabled' if TELEGRAM_TOKEN else 'Disabled'}")
+    print(f"[INFO] Execution mode: {EXECUTION_MODE}" + (f" ({WORKERS} workers)" if EXECUTION_MODE == "pool" else ""))
+    # Also delivers messages pool workers spooled and any left from a previous run
+    if TELEGRAM_TOKEN:
+        notify_queue.start_dispatcher()
     
+    metrics.register_gauge("clip_queue_depth", lambda: len(job_store.pending_dates()), queue="slots")
+    metrics.register_gauge("clip_queue_depth", notify_queue.pending_count, queue="notify")
+
+    scheduler = SlotScheduler()
+    scheduler.start()
     while True:
+        # Picks up _jobs.json written by generate_jobs or edited by hand
+        if job_store.sync_json(JSON_FILE):
+            scheduler.reload()
         current_today = datetime.now().strftime("%Y-%m-%d")
-        schedule = load_jobs(JSON_FILE)
         if current_today != last_reported_date:
-            print_daily_summary(schedule)
+            archived = job_store.archive_completed()
+            if archived:
+                print(f"[INFO] Archived {archived} completed slot(s)")
+            print_daily_summary(job_store.slots_on(current_today))
             last_reported_date = current_today
-        if not schedule:
-            time.sleep(CHECK_INTERVAL)
-            continue
         now_str = datetime.now().strftime("%Y-%m-%d,%H:%M")
-        updated = False
-        for slot in schedule:
-            slot_time = slot.get("date")
-            status = slot.get("status", "pending")
-            if slot_time <= now_str and status == "pending":
-                print(f"\n[INFO] Executing Slot: {slot_time}")
-                items = slot.get("items", [])
-                total = len(items)
-                for i, job in enumerate(items, 1):
-                    print(f"\n--- Item {i}/{total} ---")
-                    retry_count = 0
-                    success = False
-                    
-                    while retry_count <= MAX_RETRIES and not success:
-                        try:
-                            current_proxy = get_next_proxy()
-                            if current_proxy:
-                                print(f"[PROXY] Using: {current_proxy}")
-                            
-                            args_obj = normalize_job(job, current_proxy)
-                            process_pipeline(args_obj)
-                            success = True
-                            
-                            # Send Telegram notification on success
-                            job_title = job.get("title", "Unknown")
-                            job_account = job.get("account", "Unknown")
-                            send_telegram_notification(job_title, job_account, "Video Processing")
-                            
-                        except Exception as e:
-                            retry_count += 1
-                            print(f"[FAILED] Attempt {retry_count}/{MAX_RETRIES}: {e}")
-                            if retry_count <= MAX_RETRIES:
-                                wait_time = random.randint(5, 15)
-                                print(f"Retrying in {wait_time}s...")
-                                time.sleep(wait_time)
-                    
-                    if not success:
-                        print(f"[FAILED] Job failed after {MAX_RETRIES} attempts")
-                    
-                    if i < total:
-                        wait_time = random.randint(MIN_DELAY, MAX_DELAY)
-                        print(f"Waiting {wait_time}s before next job...")
-                        time.sleep(wait_time)
-                        
-                slot["status"] = "completed"
-                updated = True
-                print(f"\n[INFO] Slot {slot_time} Marked as COMPLETED")
-        if updated:
-            save_jobs(JSON_FILE, schedule)
-            last_reported_date = None 
-        time.sleep(CHECK_INTERVAL)
+        due = job_store.due_slots(now_str)
+        for slot in due:
+            slot_time = slot["date"]
+            scheduled = parse_slot_time(slot_time)
+            latency = ""
+            if scheduled:
+                delay = time.time() - scheduled.timestamp()
+                metrics.observe("clip_slot_start_latency_seconds", delay)
+                latency = f" (start latency {delay:.1f}s)"
+            print(f"\n[INFO] Executing Slot: {slot_time}{latency}")
+            items = slot.get("items", [])
+            execute_slot(slot_time, items)
+
+            job_store.set_status(slot_time, "completed")
+            clear_delivered(slot_time)
+            last_reported_date = None
+            print(f"\n[INFO] Slot {slot_time} Marked as COMPLETED")
+        if due:
+            scheduler.reload()
+
+        upcoming = scheduler.next_due()
+        if upcoming and not due:
+            print(f"[INFO] Next slot {upcoming[1]}, sleeping {max(0, upcoming[0] - time.time()):.0f}s")
+        # Wake for the next slot, a job edit, or midnight's daily summary
+        scheduler.wait(deadline=next_midnight())
 
 if __name__ == "__main__":
     try:
@@ -1,100 +1,414 @@
 import argparse
-import subprocess
+import json
+import shutil
+import time
+import numpy as np
 from pathlib import Path
-from uuid import uuid4
-from utils.helpers import run_with_spinner 
-from utils.video import get_video_info, process_video
-from utils.ai import load_whisper, transcribe, build_ass
-from utils.uploader.all import upload_by_account
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from utils import progress
+from utils.helpers import run_with_spinner, to_seconds
+from utils.concurrency import stage_slot
+from utils.video import (
+    get_video_info, invalidate_info, fetch_segment, clip_range_in_segment, media_start_time, load_audio_pcm,
+    process_video, process_video_group
+)
+from utils.ai import (
+    load_whisper, transcribe, transcribe_remote, build_ass,
+    segments_to_dicts, segments_from_dicts, TRANSCRIBE_SERVER, TRANSCRIBE_MODE
+)
+from utils.checkpoints import Checkpoints, params_hash
+from utils.ffmpeg_runner import FFmpegError
+from utils.transcript_cache import transcribe_cached, source_identity, TRANSCRIPT_CACHE
+from utils.uploader.all import upload_by_account, PLATFORMS
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_DIR = BASE_DIR / "media"
 SHORTS_DIR = MEDIA_DIR / "shorts"
 
-def process_pipeline(args):
-    SHORTS_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # Get proxy from args (added via job_runner)
+def unique_output_path(directory, name):
+    """Return directory/name.mp4, adding a numeric suffix if it already exists."""
+    path = directory / f"{name}.mp4"
+    n = 2
+    while path.exists():
+        path = directory / f"{name} ({n}).mp4"
+        n += 1
+    return path
+
+def job_workdir_of(args):
+    workdir = Path(getattr(args, 'workdir', None) or SHORTS_DIR)
+    workdir.mkdir(parents=True, exist_ok=True)
+    return workdir
+
+def job_checkpoints(workdir):
+    # Only runner-managed workdirs are private to one job; CLI runs share SHORTS_DIR
+    return Checkpoints(workdir if workdir != SHORTS_DIR else None)
+
+def delivered_marker(workdir):
+    """
+    Tombstone next to a runner workdir, written once the item is delivered.
+    The workdir itself is deleted then, so this is what lets a restarted
+    runner skip the item instead of uploading it again.
+    """
+    workdir = Path(workdir)
+    return workdir.with_name(workdir.name + ".delivered")
+
+def is_delivered(workdir):
+    return delivered_marker(workdir).exists()
+
+def abandon_workdir(workdir):
+    """After the last retry: keep rendered videos in media/shorts/ and drop the workdir."""
+    workdir = Path(workdir)
+    if workdir == SHORTS_DIR or not workdir.exists():
+        return
+    for video in workdir.glob("*.mp4"):
+        kept = unique_output_path(SHORTS_DIR, video.stem)
+        shutil.move(str(video), kept)
+        print(f"[KEPT] Video saved at: {kept}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+def job_label(args):
+    return args.title or args.url or args.local
+
+def rebase_clip(args, segment):
+    """Copy of args whose start/end point into the locally fetched segment."""
+    local_start, local_end = clip_range_in_segment(args.start, args.end, media_start_time(segment))
+    clip = SimpleNamespace(**vars(args))
+    clip.local = str(segment)
+    clip.start = f"{local_start:.3f}"
+    clip.end = f"{local_end:.3f}"
+    return clip
+
+def resolve_source(args, workdir, ckpt, span=None):
+    """
+    Returns (video_title, video_source, clip, segment).
+
+    Remote clips are fetched once into the workdir; audio, render and retries
+    all read that local copy instead of the stream. span=(start, end) fetches
+    a segment covering several clips of the same video.
+    """
     proxy = getattr(args, 'proxy', None)
 
-    # 1. Source Selection
     if args.local:
         src_path = Path(args.local).absolute()
-        video_source = str(src_path)
-        video_title = src_path.stem
+        return src_path.stem, str(src_path), args, None
+
+    span_start, span_end = span or (args.start, args.end)
+    # "timestamps": segments keep source timestamps; older ones (rebased to 0) are refetched
+    params = {"url": args.url, "span": [str(span_start), str(span_end)], "timestamps": "source"}
+    seg_key = params_hash(params)[:10]
+    segment = workdir / f"segment_{seg_key}.mkv"
+
+    rec = ckpt.get("resolve", params)
+    if rec:
+        video_title = rec["data"]["title"]
     else:
         # Pass proxy to yt-dlp extractor
-        video_title, video_source = run_with_spinner(
-            "Extracting Stream URL", 
-            lambda: get_video_info(args.url, proxy=proxy)
-        )
+        with stage_slot("download"):
+            video_title, stream_url = run_with_spinner(
+                "Extracting Stream URL", 
+                lambda: get_video_info(args.url, proxy=proxy),
+                stage="resolve"
+            )
+        if not stream_url:
+            raise RuntimeError(f"Could not resolve stream URL for {args.url}")
 
-    # 2. Extract Audio for AI
-    temp_audio = SHORTS_DIR / f"temp_audio_{uuid4().hex[:8]}.wav"
-    
-    def extract_audio():
-        cmd = ["ffmpeg", "-y", "-ss", args.start, "-to", args.end]
-        
-        # If using proxy for network stream
-        if proxy and str(video_source).startswith("http"):
-            cmd += ["-http_proxy", proxy]
-            
-        cmd += [
-            "-i", video_source, 
-            "-vn", "-ac", "1", "-ar", "16000", str(temp_audio)
-        ]
-        return subprocess.run(cmd, capture_output=True, check=True)
-
-    run_with_spinner("Extracting Audio for AI", extract_audio)
-
-    # 3. AI Transcription
-    ass_file = None
-    if args.subs:
-        model = run_with_spinner("Loading AI", lambda: load_whisper(args.model))
-        segments = run_with_spinner("Transcribing", lambda: transcribe(model, str(temp_audio)))
-        ass_file = run_with_spinner(
-            "Building Subtitles", 
-            lambda: build_ass(segments, video_title, SHORTS_DIR, args.account)
-        )
+        span_len = to_seconds(span_end) - to_seconds(span_start)
+        with stage_slot("download"), progress.track("download", "Fetching Clip Segment", total=span_len) as task:
+            try:
+                fetch_segment(stream_url, span_start, span_end, segment, proxy=proxy, on_progress=task.update)
+            except FFmpegError:
+                # The cached stream URL may be dead; the retry extracts a fresh one
+                invalidate_info(args.url, proxy=proxy)
+                raise
+        ckpt.save("resolve", params, artifact=segment, data={"title": video_title})
 
-    # 4. Final Render
-    out_name = args.title or video_title
-    short_video = SHORTS_DIR / f"{out_name}.mp4"
-    
-    run_with_spinner(
-        "Rendering Final Video",
-        lambda: process_video(args, video_source, short_video, ass_file)
+    clip = rebase_clip(args, segment)
+    return video_title, str(segment), clip, segment
+
+def load_clip_audio(clip, video_source, workdir, ckpt, params):
+    rec = ckpt.get("audio", params)
+    if rec:
+        return np.load(rec["artifact"])
+
+    with progress.track("audio", "Extracting Audio for AI", total=to_seconds(clip.end) - to_seconds(clip.start)) as task:
+        audio = load_audio_pcm(video_source, clip.start, clip.end, on_progress=task.update)
+    if ckpt.enabled:
+        audio_file = workdir / "audio.npy"
+        np.save(audio_file, audio)
+        ckpt.save("audio", params, artifact=audio_file)
+    return audio
+
+def build_subtitles(args, clip, video_source, video_title, workdir, ckpt):
+    """Decode the clip's audio in memory, transcribe it and return the .ass file."""
+    mode = getattr(args, 'transcribe_mode', None)
+    audio_params = {"source": video_source, "start": clip.start, "end": clip.end}
+    transcript_params = {
+        "audio": params_hash(audio_params),
+        "model": args.model,
+        "mode": mode or TRANSCRIBE_MODE
+    }
+    ass_params = {
+        "transcript": params_hash(transcript_params),
+        "title": video_title,
+        "account": args.account
+    }
+
+    rec = ckpt.get("ass", ass_params)
+    if rec:
+        return Path(rec["artifact"])
+
+    rec = ckpt.get("transcript", transcript_params)
+    if rec:
+        segments = segments_from_dicts(json.loads(Path(rec["artifact"]).read_text(encoding="utf-8")))
+    else:
+        segments = transcribe_clip(args, clip, video_source, workdir, ckpt, audio_params, mode)
+        if ckpt.enabled:
+            transcript_file = workdir / "transcript.json"
+            transcript_file.write_text(json.dumps(segments_to_dicts(segments)), encoding="utf-8")
+            ckpt.save("transcript", transcript_params, artifact=transcript_file)
+
+    ass_file = run_with_spinner(
+        "Building Subtitles", 
+        lambda: build_ass(segments, video_title, workdir, args.account),
+        stage="ass"
     )
+    ckpt.save("ass", ass_params, artifact=ass_file)
+    return ass_file
+
+def transcribe_clip(args, clip, video_source, workdir, ckpt, audio_params, mode):
+    with ThreadPoolExecutor(max_workers=1) as loader:
+        # Warm the model while ffmpeg decodes the audio. With the transcript
+        # cache the clip may need no Whisper at all, so it is loaded on demand
+        model_future = None
+        if not TRANSCRIBE_SERVER and not TRANSCRIPT_CACHE:
+            model_future = loader.submit(load_whisper, args.model)
+
+        audio = load_clip_audio(clip, video_source, workdir, ckpt, audio_params)
+
+        with stage_slot("transcribe"):
+            if model_future:
+                run_with_spinner("Loading AI", model_future.result, stage="model")
+
+            with progress.track("transcribe", "Transcribing", total=len(audio) / 16000) as task:
+                # Chunks transcribed so far, so progress over cache gaps stays cumulative
+                base = [0.0]
+
+                def run_transcriber(chunk):
+                    if TRANSCRIBE_SERVER:
+                        segments = transcribe_remote(TRANSCRIBE_SERVER, chunk, args.model, mode)
+                    else:
+                        if model_future:
+                            model = model_future.result()
+                        else:
+                            model = run_with_spinner("Loading AI", lambda: load_whisper(args.model), stage="model")
+                        segments = transcribe(
+                            model, chunk, mode,
+                            on_progress=lambda t, _: task.update(base[0] + t)
+                        )
+                    base[0] += len(chunk) / 16000
+                    task.update(base[0])
+                    return segments
+
+                if TRANSCRIPT_CACHE:
+                    # Only ranges of the source not transcribed by earlier clips hit Whisper
+                    return transcribe_cached(
+                        source_identity(args),
+                        f"{args.model}|{mode or TRANSCRIBE_MODE}",
+                        to_seconds(args.start),
+                        to_seconds(args.end),
+                        audio,
+                        run_transcriber
+                    )
+                return run_transcriber(audio)
+
+def render_params(args, clip, video_source, ass_file):
+    return {
+        "source": video_source,
+        "start": clip.start,
+        "end": clip.end,
+        "position": args.position,
+        "crop": args.crop,
+        "brainrot": getattr(args, 'brainrot', False),
+        "ass": str(ass_file) if ass_file else None,
+        "ass_mtime": ass_file.stat().st_mtime_ns if ass_file else None
+    }
 
-    # 5. Delivery
+def report_uploads(results):
+    for platform, r in results.items():
+        latency = f"{r['latency']}s" if r["latency"] is not None else "-"
+        line = f"[UPLOAD] {platform}: {r['status']} ({latency})"
+        if r["link"]:
+            line += f" {r['link']}"
+        if r["error"]:
+            line += f" - {r['error']}"
+        print(line)
+
+def deliver(args, short_video, out_name, workdir, ckpt, cleanup=()):
+    """Upload the rendered video, then clean up the job's temporary files."""
     upload_success = False
 
     if not args.tests:
+        # Platforms that already got this video on an earlier attempt are skipped
+        upload_params = {"title": out_name, "desc": args.description, "account": args.account}
+        done = {p for p in PLATFORMS if ckpt.get(f"upload:{p}", upload_params)}
+        if done:
+            print(f"\n[INFO] Already uploaded to: {', '.join(sorted(done))}")
+
         try:
-            run_with_spinner(
-                "Uploading...",
-                lambda: upload_by_account(
-                    video_path=short_video,
-                    title=out_name,
-                    desc=args.description,
-                    source=args.url or "Local",
-                    account=args.account
+            with stage_slot("upload"):
+                results = run_with_spinner(
+                    "Uploading...",
+                    stage="upload",
+                    func=lambda: upload_by_account(
+                        video_path=short_video,
+                        title=out_name,
+                        desc=args.description,
+                        source=args.url or "Local",
+                        account=args.account,
+                        skip=done,
+                        on_uploaded=lambda platform, res: ckpt.save(
+                            f"upload:{platform}", upload_params, data=res
+                        )
+                    )
                 )
-            )
+            report_uploads(results)
+
+            broken = [p for p, r in results.items() if r["status"] in ("error", "timeout")]
+            if broken:
+                raise RuntimeError(f"Upload did not finish on: {', '.join(broken)}")
             upload_success = True
 
         except Exception as e:
             print(f"\n[UPLOAD FAILED] {e}")
-            print(f"[KEPT] Video saved at: {short_video}")
+            if workdir == SHORTS_DIR:
+                print(f"[KEPT] Video saved at: {short_video}")
+            else:
+                # Keep the workdir: the retry resumes here, skipping finished stages
+                raise
 
-    # 6. Cleanup
-    for f in [temp_audio, ass_file]:
+    for f in cleanup:
         if f and f.exists():
             f.unlink()
 
     if not args.tests and upload_success and short_video.exists():
         short_video.unlink()
 
+    # Kept videos end up in media/shorts/ regardless of the working directory
+    if workdir != SHORTS_DIR:
+        delivered_marker(workdir).write_text(str(time.time()))
+        if short_video.exists():
+            kept = unique_output_path(SHORTS_DIR, out_name)
+            shutil.move(str(short_video), kept)
+            print(f"[KEPT] Video saved at: {kept}")
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def prepare_job(args):
+    """Source resolve + audio + subtitles. Returns the context the later stages take."""
+    SHORTS_DIR.mkdir(parents=True, exist_ok=True)
+    progress.set_job(job_label(args))
+
+    # Isolated working directory per job (set by job_runner), with stage checkpoints
+    workdir = job_workdir_of(args)
+    ckpt = job_checkpoints(workdir)
+
+    # 1. Source Selection
+    video_title, video_source, clip, segment = resolve_source(args, workdir, ckpt)
+
+    # 2. Audio + AI Transcription
+    ass_file = None
+    if args.subs:
+        ass_file = build_subtitles(args, clip, video_source, video_title, workdir, ckpt)
+
+    out_name = args.title or video_title
+    return SimpleNamespace(
+        args=args,
+        workdir=workdir,
+        ckpt=ckpt,
+        video_source=video_source,
+        clip=clip,
+        segment=segment,
+        ass_file=ass_file,
+        out_name=out_name,
+        short_video=workdir / f"{out_name}.mp4"
+    )
+
+def render_job(ctx):
+    # 3. Final Render
+    params = render_params(ctx.args, ctx.clip, ctx.video_source, ctx.ass_file)
+    if ctx.ckpt.get("render", params):
+        return
+
+    progress.set_job(job_label(ctx.args))
+    duration = to_seconds(ctx.clip.end) - to_seconds(ctx.clip.start)
+    with stage_slot("render"), progress.track("render", "Rendering Final Video", total=duration) as task:
+        process_video(ctx.clip, ctx.video_source, ctx.short_video, ctx.ass_file, on_progress=task.update)
+    ctx.ckpt.save("render", params, artifact=ctx.short_video)
+
+def deliver_job(ctx):
+    # 4. Delivery + Cleanup
+    progress.set_job(job_label(ctx.args))
+    deliver(ctx.args, ctx.short_video, ctx.out_name, ctx.workdir, ctx.ckpt, [ctx.ass_file, ctx.segment])
+
+def process_pipeline(args):
+    ctx = prepare_job(args)
+    render_job(ctx)
+    deliver_job(ctx)
+
+def process_group(args_list):
+    """
+    Process several clips cut from the same source with one fetch and one
+    render pass. Returns one (ctx, error) per item: error is None on success,
+    or the exception raised while delivering it, in which case ctx can be
+    passed to deliver_job to retry just the delivery. Errors before/while
+    rendering are raised for the whole group.
+    """
+    SHORTS_DIR.mkdir(parents=True, exist_ok=True)
+    progress.set_job(", ".join(job_label(a) for a in args_list))
+
+    workdirs = [job_workdir_of(args) for args in args_list]
+    ckpts = [job_checkpoints(workdir) for workdir in workdirs]
+    span = (
+        min(to_seconds(a.start) for a in args_list),
+        max(to_seconds(a.end) for a in args_list)
+    )
+
+    # 1. Shared source (one extraction, one segment download for URLs)
+    video_title, video_source, _, segment = resolve_source(args_list[0], workdirs[0], ckpts[0], span)
+
+    # 2. Per-clip subtitles
+    items = []
+    for args, workdir, ckpt in zip(args_list, workdirs, ckpts):
+        clip = rebase_clip(args, segment) if segment else args
+        ass_file = None
+        if args.subs:
+            ass_file = build_subtitles(args, clip, video_source, video_title, workdir, ckpt)
+        out_name = args.title or video_title
+        items.append((args, clip, workdir, ckpt, out_name, workdir / f"{out_name}.mp4", ass_file))
+
+    # 3. One decode pass for all outputs
+    entries = [(clip, short_video, ass_file) for _, clip, _, _, _, short_video, ass_file in items]
+    longest = max(to_seconds(a.end) - to_seconds(a.start) for a in args_list)
+    with stage_slot("render"), progress.track("render", f"Rendering {len(entries)} Clips", total=longest) as task:
+        process_video_group(entries, video_source, on_progress=task.update)
+
+    # 4. Per-clip delivery
+    results = []
+    for args, _, workdir, ckpt, out_name, short_video, ass_file in items:
+        ctx = SimpleNamespace(
+            args=args, workdir=workdir, ckpt=ckpt, out_name=out_name,
+            short_video=short_video, ass_file=ass_file, segment=None
+        )
+        try:
+            deliver(args, short_video, out_name, workdir, ckpt, [ass_file])
+            results.append((ctx, None))
+        except Exception as e:
+            results.append((ctx, e))
+
+    if segment and segment.exists():
+        segment.unlink()
+    return results
+
 def main():
     parser = argparse.ArgumentParser()
     group = parser.add_mutually_exclusive_group(required=True)
@@ -107,6 +421,7 @@ def main():
     parser.add_argument("-d", "--description", required=True)
     parser.add_argument("-a", "--account", default="obrolan_clip")
     parser.add_argument("-m", "--model", default="small")
+    parser.add_argument("--transcribe-mode", choices=["standard", "vad", "batched"], default=None)
     parser.add_argument("--no-subs", dest="subs", action="store_false")
     parser.set_defaults(subs=True)
     parser.add_argument("--no-crop", dest="crop", action="store_false")
@@ -0,0 +1,109 @@
+"""
+Long-lived transcription service shared by all pipeline workers.
+
+Owns the Whisper models so N render workers share one copy of the weights.
+Workers send audio with POST /transcribe?model=small&mode=vad and get back
+word-timestamped segments in the shape utils.ai.build_ass consumes.
+
+Body is either a WAV file (Content-Type: audio/wav) or raw 16 kHz mono
+s16le PCM (Content-Type: audio/pcm).
+
+Usage: python3 transcribe_server.py [--port 8765] [--workers 2]
+"""
+
+import io
+import json
+import os
+import sys
+import argparse
+import threading
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from faster_whisper import decode_audio
+from utils.ai import load_whisper, transcribe, segments_to_dicts
+
+DEFAULT_PORT = int(os.getenv("TRANSCRIBE_PORT", "8765"))
+DEFAULT_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "2"))
+
+
+def decode_body(body, content_type):
+    if content_type.startswith("audio/pcm"):
+        return np.frombuffer(body, dtype=np.int16).astype(np.float32) / 32768.0
+    return decode_audio(io.BytesIO(body), sampling_rate=16000)
+
+
+class TranscribeHandler(BaseHTTPRequestHandler):
+    # Set by main(): at most num_workers requests hit CTranslate2 at once
+    slots = None
+    num_workers = 1
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self.send_json(200, {"status": "ok", "workers": self.num_workers})
+        else:
+            self.send_error(404, "Endpoint not found")
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        if parsed.path != "/transcribe":
+            self.send_error(404, "Endpoint not found")
+            return
+
+        try:
+            params = parse_qs(parsed.query)
+            model_size = params.get("model", ["small"])[0]
+            mode = params.get("mode", [None])[0]
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            audio = decode_body(body, self.headers.get("Content-Type", "audio/wav"))
+
+            with self.slots:
+                model = load_whisper(model_size, num_workers=self.num_workers)
+                segments = transcribe(model, audio, mode=mode)
+
+            self.send_json(200, {
+                "segments": segments_to_dicts(segments),
+                "duration": len(audio) / 16000
+            })
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+
+    def send_json(self, code, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, fmt, *args):
+        print(f"[SERVER] {self.address_string()} {fmt % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--preload", default="", help="comma separated model sizes to load at startup")
+    args = parser.parse_args()
+
+    TranscribeHandler.num_workers = max(1, args.workers)
+    TranscribeHandler.slots = threading.BoundedSemaphore(TranscribeHandler.num_workers)
+
+    for size in filter(None, args.preload.split(",")):
+        print(f"[INFO] Preloading Whisper model: {size}")
+        load_whisper(size.strip(), num_workers=TranscribeHandler.num_workers)
+
+    print(f"[INFO] Transcription server on http://{args.host}:{args.port} ({args.workers} workers)")
+    server = ThreadingHTTPServer((args.host, args.port), TranscribeHandler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[!] Server stopped")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
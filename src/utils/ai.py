@@ -1,22 +1,193 @@
 import random
 import json
 import os
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
 from pathlib import Path
+from types import SimpleNamespace
+from dotenv import load_dotenv
 from faster_whisper import WhisperModel
 from .helpers import sec_to_ass
+from . import http_client, metrics
+
+load_dotenv()
+
+# Loaded models stay warm for the life of the process, evicted LRU-first
+# once their estimated footprint exceeds the budget
+WHISPER_CACHE_MB = int(os.getenv("WHISPER_CACHE_MB", "3072"))
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))
+
+# Rough int8 resident size per model, used only for the cache budget
+MODEL_SIZE_MB = {
+    "tiny": 80,
+    "base": 150,
+    "small": 500,
+    "medium": 1500,
+    "large": 3100,
+}
+
+# Transcription mode: standard | vad | batched
+TRANSCRIBE_MODES = ("standard", "vad", "batched")
+TRANSCRIBE_MODE = os.getenv("TRANSCRIBE_MODE", "standard")
+TRANSCRIBE_BATCH_SIZE = int(os.getenv("TRANSCRIBE_BATCH_SIZE", "16"))
+
+# Shared transcription service (src/transcribe_server.py), e.g. http://127.0.0.1:8765
+TRANSCRIBE_SERVER = os.getenv("TRANSCRIBE_SERVER", "")
+TRANSCRIBE_SERVER_TIMEOUT = int(os.getenv("TRANSCRIBE_SERVER_TIMEOUT", "900"))
+
+_model_cache = OrderedDict()
+_model_cache_lock = threading.Lock()
+
+
+def estimate_model_mb(model_size, compute_type):
+    base = next(
+        (mb for name, mb in MODEL_SIZE_MB.items() if str(model_size).startswith(name)),
+        MODEL_SIZE_MB["large"]
+    )
+    # float16/float32 weights take 2x/4x the int8 footprint
+    if "float32" in compute_type:
+        return base * 4
+    if "float16" in compute_type:
+        return base * 2
+    return base
+
+
+def _evict_for(needed_mb):
+    used = sum(entry["mb"] for entry in _model_cache.values())
+    while _model_cache and used + needed_mb > WHISPER_CACHE_MB:
+        key, entry = _model_cache.popitem(last=False)
+        used -= entry["mb"]
+        print(f"\n[INFO] Evicted Whisper model {key[0]} ({entry['mb']} MB) from cache")
+
+
+def load_whisper(model_size, device=None, compute_type=None, cpu_threads=None, num_workers=1):
+    """Return a cached WhisperModel, loading it (and evicting LRU models) on a miss."""
+    device = device or WHISPER_DEVICE
+    compute_type = compute_type or WHISPER_COMPUTE_TYPE
+    cpu_threads = WHISPER_CPU_THREADS if cpu_threads is None else cpu_threads
+    key = (model_size, device, compute_type, cpu_threads, num_workers)
+
+    with _model_cache_lock:
+        entry = _model_cache.get(key)
+        if entry:
+            _model_cache.move_to_end(key)
+            return entry["model"]
+
+        mb = estimate_model_mb(model_size, compute_type)
+        _evict_for(mb)
+        with metrics.timed("clip_model_load_seconds", model=model_size):
+            model = WhisperModel(
+                model_size,
+                device=device,
+                compute_type=compute_type,
+                cpu_threads=cpu_threads,
+                num_workers=num_workers
+            )
+        _model_cache[key] = {"model": model, "mb": mb}
+        return model
+
+
+def segments_to_dicts(segments):
+    """Plain-JSON form of Whisper segments (keeps only what build_ass needs)."""
+    return [
+        {
+            "start": seg.start,
+            "end": seg.end,
+            "text": seg.text,
+            "words": [
+                {"start": w.start, "end": w.end, "word": w.word}
+                for w in (seg.words or [])
+            ]
+        }
+        for seg in segments
+    ]
 
 
-def load_whisper(model_size):
-    return WhisperModel(model_size, device="cpu", compute_type="int8")
+def segments_from_dicts(data):
+    """Inverse of segments_to_dicts: objects with the attributes build_ass reads."""
+    return [
+        SimpleNamespace(
+            start=seg["start"],
+            end=seg["end"],
+            text=seg.get("text", ""),
+            words=[SimpleNamespace(**w) for w in seg.get("words", [])]
+        )
+        for seg in data
+    ]
 
 
-def transcribe(model, video_path):
-    segs, _ = model.transcribe(
-        str(video_path),
-        beam_size=5,
-        word_timestamps=True
+def transcribe_remote(server_url, audio, model_size, mode=None):
+    """
+    Transcribe through a running transcribe_server instead of a local model.
+    audio is either 16 kHz mono float32 PCM or a path to a WAV file.
+    """
+    if isinstance(audio, np.ndarray):
+        body = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        content_type = "audio/pcm"
+    else:
+        body = Path(audio).read_bytes()
+        content_type = "audio/wav"
+
+    res = http_client.post(
+        f"{server_url.rstrip('/')}/transcribe",
+        params={"model": model_size, "mode": mode or TRANSCRIBE_MODE},
+        data=body,
+        headers={"Content-Type": content_type},
+        timeout=(10, TRANSCRIBE_SERVER_TIMEOUT)
     )
-    return list(segs)
+    res.raise_for_status()
+    return segments_from_dicts(res.json()["segments"])
+
+
+def transcribe(model, audio, mode=None, batch_size=None, on_progress=None):
+    """
+    audio: 16 kHz mono float32 array, or a path ffmpeg/PyAV can decode.
+
+    mode: "standard" decodes the whole clip, "vad" skips non-speech with
+    Silero VAD, "batched" uses VAD chunks decoded together through
+    faster-whisper's BatchedInferencePipeline.
+
+    on_progress(seconds, duration) is called with each decoded segment's end.
+    """
+    mode = mode or TRANSCRIBE_MODE
+    if mode not in TRANSCRIBE_MODES:
+        raise ValueError(f"Unknown transcribe mode: {mode}")
+    if not isinstance(audio, np.ndarray):
+        audio = str(audio)
+
+    started = time.perf_counter()
+    if mode == "batched":
+        from faster_whisper import BatchedInferencePipeline
+        segs, info = BatchedInferencePipeline(model=model).transcribe(
+            audio,
+            beam_size=5,
+            word_timestamps=True,
+            batch_size=batch_size or TRANSCRIBE_BATCH_SIZE
+        )
+    else:
+        segs, info = model.transcribe(
+            audio,
+            beam_size=5,
+            word_timestamps=True,
+            vad_filter=(mode == "vad")
+        )
+    segments = []
+    for seg in segs:
+        segments.append(seg)
+        if on_progress:
+            on_progress(seg.end, info.duration)
+
+    elapsed = time.perf_counter() - started
+    rtf = elapsed / info.duration if info.duration else 0.0
+    if info.duration:
+        metrics.observe("clip_transcribe_rtf", rtf, mode=mode)
+        metrics.inc("clip_transcribed_audio_seconds_total", info.duration, mode=mode)
+    print(f"\n[INFO] Transcribed {info.duration:.1f}s of audio in {elapsed:.1f}s ({mode}, RTF {rtf:.3f})")
+    return segments
 
 
 def add_watermark(lines, text, duration, position="center"):
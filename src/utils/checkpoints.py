@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+CHECKPOINT_FILE = "_checkpoints.json"
+
+
+def params_hash(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Checkpoints:
+    """
+    Durable per-job record of completed pipeline stages.
+
+    Each stage is stored with the hash of the parameters it was produced from
+    and, optionally, the path of its artifact. A stage only counts as done if
+    the hash still matches and the artifact still exists, so a retry or a
+    runner restart resumes at the first incomplete stage.
+    Created with workdir=None it is disabled and never reports a stage as done.
+    """
+
+    def __init__(self, workdir=None):
+        self.path = Path(workdir) / CHECKPOINT_FILE if workdir else None
+        self._lock = threading.Lock()
+        self._stages = self._load()
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def _load(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _flush(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._stages, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def get(self, stage, params):
+        """Return the stage record if it is complete for these params, else None."""
+        rec = self._stages.get(stage)
+        if not rec or rec.get("hash") != params_hash(params):
+            return None
+        if rec.get("artifact") and not Path(rec["artifact"]).exists():
+            return None
+        return rec
+
+    def save(self, stage, params, artifact=None, data=None):
+        rec = {
+            "hash": params_hash(params),
+            "artifact": str(artifact) if artifact else None,
+            "data": data,
+            "at": time.time()
+        }
+        if not self.enabled:
+            return rec
+        with self._lock:
+            if not self.path.parent.exists():
+                # Job already cleaned up (e.g. a late upload finishing after it gave up)
+                return rec
+            # Another Checkpoints on the same workdir (an earlier attempt's upload
+            # thread) may have saved stages since this one loaded
+            self._stages = dict(self._load(), **{stage: rec})
+            self._flush()
+        return rec
+
+    def clear(self, stage):
+        if not self.enabled or stage not in self._stages:
+            return
+        with self._lock:
+            self._stages.pop(stage, None)
+            self._flush()
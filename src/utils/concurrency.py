@@ -0,0 +1,53 @@
+import os
+import multiprocessing
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per-stage concurrency limits shared by every worker process of a slot
+STAGES = ("download", "transcribe", "render", "upload")
+
+STAGE_LIMITS = {
+    "download": int(os.getenv("DOWNLOAD_CONCURRENCY", "4")),
+    "transcribe": int(os.getenv("TRANSCRIBE_CONCURRENCY", "2")),
+    "render": int(os.getenv("RENDER_CONCURRENCY", "2")),
+    "upload": int(os.getenv("UPLOAD_CONCURRENCY", "3")),
+}
+
+# Pool workers start from a clean fork server rather than a fork of the
+# runner, whose background threads (progress, metrics, notifications,
+# scheduler) may hold a lock at the moment of the fork
+POOL_CONTEXT = multiprocessing.get_context("forkserver")
+
+# Filled in by init_worker() inside pool processes; empty means unlimited
+_semaphores = {}
+
+
+def create_semaphores():
+    """Create one process-shared semaphore per stage (call in the parent)."""
+    return {
+        stage: POOL_CONTEXT.Semaphore(max(1, STAGE_LIMITS[stage]))
+        for stage in STAGES
+    }
+
+
+def init_worker(semaphores):
+    """Pool initializer: install the parent's semaphores in this worker."""
+    _semaphores.clear()
+    _semaphores.update(semaphores)
+
+
+@contextmanager
+def stage_slot(stage):
+    """Hold one of the stage's concurrency slots for the duration of the block."""
+    sem = _semaphores.get(stage)
+    if sem is None:
+        yield
+        return
+
+    sem.acquire()
+    try:
+        yield
+    finally:
+        sem.release()
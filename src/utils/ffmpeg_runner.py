@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+import subprocess
+from collections import deque
+from dotenv import load_dotenv
+from . import metrics
+
+load_dotenv()
+
+# Kill ffmpeg when out_time has not advanced for this many seconds
+FFMPEG_STALL_TIMEOUT = float(os.getenv("FFMPEG_STALL_TIMEOUT", "60"))
+# Wall-clock budget: FFMPEG_MIN_BUDGET + FFMPEG_TIME_FACTOR x media seconds processed
+FFMPEG_MIN_BUDGET = float(os.getenv("FFMPEG_MIN_BUDGET", "120"))
+FFMPEG_TIME_FACTOR = float(os.getenv("FFMPEG_TIME_FACTOR", "6"))
+
+# stderr lines kept for the error message
+STDERR_TAIL = 30
+
+
+class FFmpegError(subprocess.CalledProcessError):
+    """
+    ffmpeg exited non-zero or was killed by the watchdog. reason is
+    "stalled", "timeout" or "failed"; out_time is how far it got (seconds).
+    Still a CalledProcessError, so existing handlers keep working.
+    """
+
+    def __init__(self, reason, cmd, returncode, stderr="", out_time=0.0):
+        super().__init__(returncode, cmd, stderr=stderr)
+        self.reason = reason
+        self.out_time = out_time
+
+    @property
+    def retriable(self):
+        # Stalls, timeouts and errors reading a remote stream may pass on a retry;
+        # a failure on purely local input (bad filter, corrupt file) will not
+        network = any(str(arg).startswith("http") for arg in self.cmd)
+        return self.reason != "failed" or network
+
+    def __str__(self):
+        tail = self.stderr.strip().splitlines()[-3:] if self.stderr else []
+        detail = f": {' | '.join(tail)}" if tail else ""
+        return f"ffmpeg {self.reason} (exit {self.returncode}) at {self.out_time:.1f}s{detail}"
+
+
+def _with_progress(cmd):
+    """Insert -nostdin and -progress pipe:2 as global options after the binary."""
+    head, rest = cmd[0], list(cmd[1:])
+    extra = ["-progress", "pipe:2"]
+    if "-nostdin" not in rest:
+        extra.insert(0, "-nostdin")
+    return [head] + extra + rest
+
+
+def run_ffmpeg(cmd, duration=None, label="ffmpeg", capture_stdout=False, on_progress=None, stall_timeout=None):
+    """
+    Run an ffmpeg command under a watchdog.
+
+    Progress key=value lines on stderr are parsed for out_time; if it stops
+    advancing for stall_timeout (default FFMPEG_STALL_TIMEOUT) seconds, or
+    the run exceeds its budget (derived from duration, the media seconds
+    being processed), ffmpeg is killed. on_progress(out_time, duration) is called as out_time
+    advances. Returns stdout bytes when capture_stdout, else None; raises
+    FFmpegError on any failure.
+    """
+    cmd = _with_progress([str(c) for c in cmd])
+    budget = FFMPEG_MIN_BUDGET + FFMPEG_TIME_FACTOR * (duration or 0)
+    stall_timeout = stall_timeout or FFMPEG_STALL_TIMEOUT
+
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+
+    state = {"out_time": 0.0, "advanced": time.monotonic()}
+    stderr_tail = deque(maxlen=STDERR_TAIL)
+    stdout_chunks = []
+
+    def read_stderr():
+        for raw in proc.stderr:
+            line = raw.decode("utf-8", errors="replace").strip()
+            key, sep, value = line.partition("=")
+            if sep and key in ("out_time_us", "out_time_ms"):
+                # Both keys are in microseconds; "N/A" before the first frame
+                try:
+                    out_time = int(value) / 1e6
+                except ValueError:
+                    continue
+                if out_time > state["out_time"]:
+                    state["out_time"] = out_time
+                    state["advanced"] = time.monotonic()
+                    if on_progress:
+                        on_progress(out_time, duration)
+            elif sep and " " not in key:
+                continue
+            elif line:
+                stderr_tail.append(line)
+
+    def read_stdout():
+        for chunk in iter(lambda: proc.stdout.read(1 << 20), b""):
+            stdout_chunks.append(chunk)
+
+    readers = [threading.Thread(target=read_stderr, daemon=True)]
+    if capture_stdout:
+        readers.append(threading.Thread(target=read_stdout, daemon=True))
+    for t in readers:
+        t.start()
+
+    started = time.monotonic()
+    reason = None
+    while proc.poll() is None:
+        time.sleep(0.5)
+        now = time.monotonic()
+        if now - state["advanced"] > stall_timeout:
+            reason = "stalled"
+        elif now - started > budget:
+            reason = "timeout"
+        if reason:
+            print(f"[WARN] {label} {reason} at {state['out_time']:.1f}s, killing ffmpeg")
+            proc.kill()
+            proc.wait()
+            break
+
+    for t in readers:
+        t.join(timeout=5)
+
+    if reason or proc.returncode != 0:
+        metrics.inc("clip_ffmpeg_failures_total", reason=reason or "failed", label=label)
+        raise FFmpegError(
+            reason or "failed", cmd, proc.returncode,
+            stderr="\n".join(stderr_tail), out_time=state["out_time"]
+        )
+    return b"".join(stdout_chunks) if capture_stdout else None
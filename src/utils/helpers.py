@@ -1,8 +1,5 @@
 import re
-import sys
-import time
-import threading
-import itertools
+from . import progress
 
 def normalize_time(t):
     if not t: return "00_00"
@@ -18,6 +15,16 @@ def normalize_time(t):
         total = int(float(t))
     return f"{total//60:02d}:{total%60:02d}"
 
+def to_seconds(t):
+    """Parse "HH:MM:SS(.ms)", "MM:SS" or plain seconds into a float."""
+    t = str(t).strip()
+    if ":" not in t:
+        return float(t)
+    total = 0.0
+    for part in t.split(":"):
+        total = total * 60 + float(part)
+    return total
+
 def sanitize_filename(s):
     s = s.encode("ascii", "ignore").decode("ascii") 
     return re.sub(r"[^\w\s-]", "", s).strip().replace(" ", "_")
@@ -28,26 +35,7 @@ def sec_to_ass(t):
     s = t % 60
     return f"{h}:{m:02d}:{s:05.2f}"
 
-stop_spinner = threading.Event()
-def spinner(msg):
-    chars = itertools.cycle(["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"])
-    while not stop_spinner.is_set():
-        sys.stderr.write(f"\r\033[K[INFO] {msg} {next(chars)}")
-        sys.stderr.flush()
-        time.sleep(0.1)
-    sys.stderr.write("\r\033[K")
-    sys.stderr.flush()
-
-def run_with_spinner(msg, func):
-    stop_spinner.clear()
-    t = threading.Thread(target=spinner, args=(msg,), daemon=True)
-    t.start()
-    try:
+def run_with_spinner(msg, func, stage=None):
+    """Run func while msg shows on the progress line (see utils.progress)."""
+    with progress.track(stage or msg, msg):
         return func()
-    except Exception as e:
-        stop_spinner.set()
-        t.join()
-        raise e
-    finally:
-        stop_spinner.set()
-        t.join()
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DATA_DIR = BASE_DIR / "data"
+JOBS_JSON = DATA_DIR / "_jobs.json"
+JOBS_DB = Path(os.getenv("JOBS_DB", str(DATA_DIR / "jobs.db")))
+# Touched after edits from outside the runner so its scheduler wakes up
+WAKE_FILE = DATA_DIR / ".jobs_wake"
+
+# Completed slots older than this many days are archived and no longer listed
+JOBS_ARCHIVE_DAYS = int(os.getenv("JOBS_ARCHIVE_DAYS", "7"))
+
+# Dates are stored zero-padded so string order (due_slots, slots_on) is time order
+DATE_FORMAT = "%Y-%m-%d,%H:%M"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    date TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    items TEXT NOT NULL,
+    extra TEXT,
+    archived INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS slots_due ON slots (archived, status, date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    JOBS_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with _init_lock:
+        if JOBS_DB not in _initialized:
+            conn.executescript(SCHEMA)
+            _normalize_stored_dates(conn)
+            _initialized.add(JOBS_DB)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def normalize_date(date):
+    """ "2026-10-17,9:05" -> "2026-10-17,09:05"; malformed dates are returned unchanged."""
+    try:
+        return datetime.strptime(date.strip(), DATE_FORMAT).strftime(DATE_FORMAT)
+    except (AttributeError, ValueError):
+        return date
+
+
+def _normalize_stored_dates(conn):
+    """Rewrite rows saved before dates were normalized; a clash keeps the padded row."""
+    rows = conn.execute("SELECT date FROM slots").fetchall()
+    for (date,) in rows:
+        fixed = normalize_date(date)
+        if fixed == date:
+            continue
+        try:
+            conn.execute("UPDATE slots SET date = ? WHERE date = ?", (fixed, date))
+        except sqlite3.IntegrityError:
+            print(f"[WARN] Slot {date!r} duplicates {fixed!r}, keeping {fixed!r}")
+            conn.execute("DELETE FROM slots WHERE date = ?", (date,))
+
+
+class _transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _to_slot(row):
+    """Row back to the _jobs.json slot shape."""
+    slot = json.loads(row["extra"]) if row["extra"] else {}
+    slot.update(date=row["date"], status=row["status"], items=json.loads(row["items"]))
+    return slot
+
+
+def _upsert(conn, slot, keep_completed=False):
+    date = normalize_date(slot.get("date"))
+    if not date:
+        raise ValueError(f"Slot without a date: {slot}")
+    items = json.dumps(slot.get("items", []), ensure_ascii=False, sort_keys=True)
+    extra = {k: v for k, v in slot.items() if k not in ("date", "status", "items")}
+    status = slot.get("status", "pending")
+    archived = 0
+
+    if keep_completed:
+        # A stale export must not put an executed (or archived) slot back in the queue
+        row = conn.execute("SELECT status, items, archived FROM slots WHERE date = ?", (date,)).fetchone()
+        if row and row["items"] == items and row["status"] != "pending":
+            status = row["status"]
+            archived = row["archived"]
+
+    conn.execute(
+        "INSERT INTO slots (date, status, items, extra, archived, updated) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (date) DO UPDATE SET status = excluded.status, items = excluded.items, "
+        "extra = excluded.extra, archived = excluded.archived, updated = excluded.updated",
+        (date, status, items, json.dumps(extra, ensure_ascii=False) if extra else None, archived, time.time())
+    )
+
+
+def due_slots(now_str):
+    """Pending slots whose "YYYY-MM-DD,HH:MM" date is at or before now_str, oldest first."""
+    rows = _connect().execute(
+        "SELECT * FROM slots WHERE archived = 0 AND status = 'pending' AND date <= ? ORDER BY date",
+        (now_str,)
+    ).fetchall()
+    return [_to_slot(r) for r in rows]
+
+
+def pending_dates():
+    rows = _connect().execute(
+        "SELECT date FROM slots WHERE archived = 0 AND status = 'pending' ORDER BY date"
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def signal_change():
+    WAKE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(WAKE_FILE, "w") as f:
+        f.write(str(time.time()))
+
+
+def slots_on(day):
+    """Slots scheduled on day ("YYYY-MM-DD")."""
+    rows = _connect().execute(
+        "SELECT * FROM slots WHERE date >= ? AND date < ? ORDER BY date",
+        (f"{day},", f"{day},~")
+    ).fetchall()
+    return [_to_slot(r) for r in rows]
+
+
+def set_status(date, status):
+    with _transaction(_connect()) as conn:
+        conn.execute(
+            "UPDATE slots SET status = ?, updated = ? WHERE date = ?",
+            (status, time.time(), normalize_date(date))
+        )
+
+
+def list_slots(include_archived=False):
+    where = "" if include_archived else "WHERE archived = 0"
+    rows = _connect().execute(f"SELECT * FROM slots {where} ORDER BY date").fetchall()
+    return [_to_slot(r) for r in rows]
+
+
+def replace_all(schedule):
+    """
+    Make the active (non-archived) slots exactly schedule, as the web
+    manager's save does. Archived slots are left alone, and like an import,
+    a slot already executed stays completed if its items are unchanged.
+    """
+    with _transaction(_connect()) as conn:
+        for slot in schedule:
+            _upsert(conn, slot, keep_completed=True)
+        dates = [normalize_date(s["date"]) for s in schedule]
+        conn.execute(
+            f"DELETE FROM slots WHERE archived = 0 AND date NOT IN ({','.join('?' * len(dates))})",
+            dates
+        )
+    signal_change()
+
+
+def archive_completed(days=JOBS_ARCHIVE_DAYS):
+    """Hide completed slots older than days from listings and scans. Returns how many."""
+    cutoff = (datetime.now() - timedelta(days=days)).strftime(DATE_FORMAT)
+    with _transaction(_connect()) as conn:
+        cur = conn.execute(
+            "UPDATE slots SET archived = 1 WHERE archived = 0 AND status != 'pending' AND date < ?",
+            (cutoff,)
+        )
+    return cur.rowcount
+
+
+def import_json(path=JOBS_JSON):
+    """
+    Merge a _jobs.json file into the store. Slots are matched by date; a
+    slot the store already executed stays completed if its items are
+    unchanged. Returns the number of slots read.
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        schedule = json.load(f)
+    with _transaction(_connect()) as conn:
+        for slot in schedule:
+            _upsert(conn, slot, keep_completed=True)
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('json_mtime', ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (str(path.stat().st_mtime_ns),)
+        )
+    return len(schedule)
+
+
+def export_json(path=JOBS_JSON, include_archived=False):
+    path = Path(path)
+    slots = list_slots(include_archived)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(slots, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+    with _transaction(_connect()) as conn:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('json_mtime', ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (str(path.stat().st_mtime_ns),)
+        )
+    return len(slots)
+
+
+def sync_json(path=JOBS_JSON):
+    """
+    Import _jobs.json if it changed since it was last imported or exported,
+    so generated or hand-edited files keep working. A stat call otherwise.
+    """
+    path = Path(path)
+    if not path.exists():
+        return False
+    row = _connect().execute("SELECT value FROM meta WHERE key = 'json_mtime'").fetchone()
+    if row and row[0] == str(path.stat().st_mtime_ns):
+        return False
+    count = import_json(path)
+    print(f"[INFO] Imported {count} slot(s) from {path.name} into the job store")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import/export the job store as _jobs.json")
+    parser.add_argument("action", choices=["import", "export", "archive"])
+    parser.add_argument("--file", default=str(JOBS_JSON))
+    parser.add_argument("--all", action="store_true", help="Export archived slots too")
+    args = parser.parse_args()
+
+    if args.action == "import":
+        print(f"[INFO] Imported {import_json(args.file)} slot(s) from {args.file}")
+        signal_change()
+    elif args.action == "export":
+        print(f"[INFO] Exported {export_json(args.file, args.all)} slot(s) to {args.file}")
+    else:
+        print(f"[INFO] Archived {archive_completed()} completed slot(s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
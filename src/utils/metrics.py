@@ -0,0 +1,315 @@
+import os
+import json
+import math
+import time
+import fcntl
+import atexit
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DATA_DIR = BASE_DIR / "data"
+METRICS_DIR = DATA_DIR / "metrics"
+# Counters and histograms of processes that exited, folded together
+TOTALS_FILE = METRICS_DIR / "_totals.json"
+LOCK_FILE = METRICS_DIR / ".lock"
+
+# Seconds between writes of this process's metrics file
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
+
+STAGE_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 4)
+LATENCY_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 900)
+
+# name: (type, help, buckets)
+METRICS = {
+    "clip_stage_seconds": (
+        "histogram", "Wall-clock time of a pipeline stage (upload:<platform> is the byte transfer alone)", STAGE_BUCKETS),
+    "clip_upload_seconds": (
+        "histogram", "Time of one platform upload including processing waits", STAGE_BUCKETS),
+    "clip_model_load_seconds": (
+        "histogram", "Time to load a Whisper model on a cache miss", STAGE_BUCKETS),
+    "clip_transcribe_rtf": (
+        "histogram", "Transcription real-time factor (processing seconds per audio second)", RTF_BUCKETS),
+    "clip_slot_start_latency_seconds": (
+        "histogram", "Delay between a slot's scheduled time and its start", LATENCY_BUCKETS),
+    "clip_transcribed_audio_seconds_total": ("counter", "Seconds of audio transcribed", None),
+    "clip_uploads_total": ("counter", "Platform uploads by result", None),
+    "clip_jobs_total": ("counter", "Finished jobs by result", None),
+    "clip_job_retries_total": ("counter", "Job attempts repeated after a failure", None),
+    "clip_upload_chunk_retries_total": ("counter", "Upload chunks sent again after a failure", None),
+    "clip_ffmpeg_failures_total": ("counter", "ffmpeg runs that failed or were killed by the watchdog", None),
+    "clip_bytes_downloaded_total": ("counter", "Bytes of source segments downloaded", None),
+    "clip_bytes_uploaded_total": ("counter", "Bytes of video accepted by upload endpoints", None),
+    "clip_http_requests_total": ("counter", "Requests sent through the pooled HTTP session", None),
+    "clip_http_connections_opened_total": (
+        "counter", "HTTP connections opened; clip_http_requests_total minus this is connections reused", None),
+    "clip_queue_depth": ("gauge", "Items waiting in a queue", None),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_gauges = {}
+_gauge_fns = {}
+_dirty = False
+_writers = {}
+_owner = {"pid": os.getpid(), "started": time.time()}
+
+
+def _own():
+    """Forked children (pool workers) start from zero instead of re-reporting the parent's values."""
+    if _owner["pid"] != os.getpid():
+        for table in (_counters, _histograms, _gauges, _gauge_fns):
+            table.clear()
+        _owner.update(pid=os.getpid(), started=time.time())
+
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f"Unknown metric: {name}")
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    global _dirty
+    key = _key(name, labels)
+    with _lock:
+        _own()
+        _counters[key] = _counters.get(key, 0) + value
+        _dirty = True
+    _ensure_writer()
+
+
+def observe(name, value, **labels):
+    global _dirty
+    key = _key(name, labels)
+    buckets = METRICS[name][2]
+    with _lock:
+        _own()
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+        _dirty = True
+    _ensure_writer()
+
+
+def set_gauge(name, value, **labels):
+    global _dirty
+    key = _key(name, labels)
+    with _lock:
+        _own()
+        _gauges[key] = value
+        _dirty = True
+    _ensure_writer()
+
+
+def register_gauge(name, fn, **labels):
+    """Gauge whose value is fn(), read each time this process writes its metrics."""
+    with _lock:
+        _own()
+        _gauge_fns[_key(name, labels)] = fn
+    _ensure_writer()
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observe the duration of the block, whether it succeeds or raises."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(name, time.monotonic() - started, **labels)
+
+
+def _entries(table):
+    return [[name, dict(labels), value] for (name, labels), value in table.items()]
+
+
+def snapshot():
+    with _lock:
+        gauges = dict(_gauges)
+        fns = dict(_gauge_fns)
+        data = {
+            "counters": _entries(_counters),
+            "histograms": _entries({k: dict(v, buckets=list(v["buckets"])) for k, v in _histograms.items()}),
+        }
+    for key, fn in fns.items():
+        try:
+            gauges[key] = fn()
+        except Exception as e:
+            print(f"[WARN] Metric {key[0]} unavailable: {e}")
+    data["gauges"] = _entries(gauges)
+    return data
+
+
+def _process_file():
+    return METRICS_DIR / f"{_owner['pid']}-{int(_owner['started'])}.json"
+
+
+def _write_json(path, data):
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def flush():
+    """Write this process's metrics file now, e.g. before a pool worker exits."""
+    global _dirty
+    with _lock:
+        _own()
+        if not (_counters or _histograms or _gauges or _gauge_fns):
+            return
+        _dirty = False
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        _write_json(_process_file(), snapshot())
+    except OSError as e:
+        print(f"[WARN] Could not write metrics: {e}")
+
+
+def _writer():
+    while True:
+        time.sleep(METRICS_INTERVAL)
+        if _dirty or (_gauge_fns and _owner["pid"] == os.getpid()):
+            flush()
+
+
+def _ensure_writer():
+    pid = os.getpid()
+    if _writers.get(pid):
+        return
+    with _lock:
+        if _writers.get(pid):
+            return
+        _writers[pid] = threading.Thread(target=_writer, name="metrics", daemon=True)
+        _writers[pid].start()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _merge(into, data, gauges=True):
+    """Add data's counters and histograms (and gauges) into the dict-keyed totals."""
+    for name, labels, value in data.get("counters", []):
+        key = (name, tuple(sorted(labels.items())))
+        into["counters"][key] = into["counters"].get(key, 0) + value
+    for name, labels, hist in data.get("histograms", []):
+        key = (name, tuple(sorted(labels.items())))
+        total = into["histograms"].get(key)
+        if total is None or len(total["buckets"]) != len(hist["buckets"]):
+            into["histograms"][key] = dict(hist, buckets=list(hist["buckets"]))
+            continue
+        total["buckets"] = [a + b for a, b in zip(total["buckets"], hist["buckets"])]
+        total["sum"] += hist["sum"]
+        total["count"] += hist["count"]
+    if gauges:
+        for name, labels, value in data.get("gauges", []):
+            key = (name, tuple(sorted(labels.items())))
+            into["gauges"][key] = into["gauges"].get(key, 0) + value
+
+
+def _empty():
+    return {"counters": {}, "histograms": {}, "gauges": {}}
+
+
+def collect():
+    """
+    Metrics of all processes: the folded totals plus every live process's
+    file. Files left by processes that exited are folded into the totals
+    (counters and histograms only; their gauges are dropped) and removed.
+    """
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    merged = _empty()
+    with open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        totals = _empty()
+        _merge(totals, _read(TOTALS_FILE) or {})
+        dead = []
+        for path in METRICS_DIR.glob("*-*.json"):
+            pid = int(path.name.split("-", 1)[0])
+            data = _read(path)
+            if data is None:
+                continue
+            if _alive(pid):
+                _merge(merged, data)
+            else:
+                _merge(totals, data, gauges=False)
+                dead.append(path)
+        if dead:
+            _write_json(TOTALS_FILE, {
+                "counters": _entries(totals["counters"]),
+                "histograms": _entries(totals["histograms"]),
+            })
+            for path in dead:
+                path.unlink(missing_ok=True)
+    _merge(merged, {"counters": _entries(totals["counters"]), "histograms": _entries(totals["histograms"])})
+    return merged
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _fmt_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(merged=None):
+    """Prometheus text exposition format (version 0.0.4)."""
+    merged = merged if merged is not None else collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        table = {"counter": merged["counters"], "gauge": merged["gauges"], "histogram": merged["histograms"]}[kind]
+        series = sorted((labels, value) for (n, labels), value in table.items() if n == name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind != "histogram":
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+                continue
+            for bound, count in zip(buckets, value["buckets"]):
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {value['count']}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(float(value['sum']))}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+atexit.register(flush)
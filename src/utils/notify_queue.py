@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import atexit
+import random
+import itertools
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+from utils import http_client
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DATA_DIR = BASE_DIR / "data"
+SPOOL_DIR = DATA_DIR / "notify_spool"
+DEAD_DIR = SPOOL_DIR / "dead"
+
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+
+# Telegram allows about one message per second per chat and 20 per minute in groups
+NOTIFY_MIN_INTERVAL = float(os.getenv("NOTIFY_MIN_INTERVAL", "1.1"))
+NOTIFY_MAX_PER_MINUTE = int(os.getenv("NOTIFY_MAX_PER_MINUTE", "20"))
+# Messages arriving within this window are considered one burst
+NOTIFY_COALESCE_WINDOW = float(os.getenv("NOTIFY_COALESCE_WINDOW", "3"))
+# Bursts of at least this many messages are sent as a single digest
+NOTIFY_DIGEST_MIN = int(os.getenv("NOTIFY_DIGEST_MIN", "3"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+# How long a process waits at exit for queued messages to go out
+NOTIFY_FLUSH_TIMEOUT = float(os.getenv("NOTIFY_FLUSH_TIMEOUT", "15"))
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LEN = 4096
+# Claimed files older than this belong to a dispatcher that died mid-send
+STALE_CLAIM = 300
+
+_seq = itertools.count()
+_wake = threading.Event()
+_lock = threading.Lock()
+_dispatcher = None
+_dispatch_enabled = True
+
+
+def enqueue(text, chat_id=None):
+    """
+    Spool a Telegram message and return immediately. Returns False when
+    Telegram is not configured. Delivery happens on the dispatcher thread.
+    """
+    chat_id = chat_id or TELEGRAM_CHAT_ID
+    if not TELEGRAM_TOKEN or not chat_id:
+        return False
+
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    msg = {"chat_id": str(chat_id), "text": text, "created": now, "attempts": 0, "next_attempt": now}
+    name = f"{now:.6f}_{os.getpid()}_{next(_seq)}.json"
+    tmp = SPOOL_DIR / f".{name}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(msg, f, ensure_ascii=False)
+    os.replace(tmp, SPOOL_DIR / name)
+
+    if _dispatch_enabled:
+        start_dispatcher()
+        _wake.set()
+    return True
+
+
+def disable_dispatch():
+    """Only spool in this process (pool workers); the parent's dispatcher sends."""
+    global _dispatch_enabled
+    _dispatch_enabled = False
+
+
+def start_dispatcher():
+    global _dispatcher
+    with _lock:
+        if _dispatcher is None or not _dispatcher.is_alive():
+            _release_stale_claims()
+            _dispatcher = threading.Thread(target=_run, name="notify-dispatcher", daemon=True)
+            _dispatcher.start()
+
+
+def pending_count(due_only=False):
+    """Messages waiting in the spool (or being sent by this process)."""
+    if not SPOOL_DIR.exists():
+        return 0
+    count = sum(1 for _ in SPOOL_DIR.glob(f"*.json.claimed-{os.getpid()}"))
+    now = time.time()
+    for path in SPOOL_DIR.glob("*.json"):
+        if due_only:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    if json.load(f).get("next_attempt", 0) > now:
+                        continue
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+        count += 1
+    return count
+
+
+def flush(timeout=NOTIFY_FLUSH_TIMEOUT):
+    """
+    Wait up to timeout for due messages to go out. Anything still spooled
+    (including messages backing off) is sent by the next dispatcher.
+    """
+    if _dispatcher is None or not _dispatcher.is_alive():
+        return
+    deadline = time.monotonic() + timeout
+    _wake.set()
+    while pending_count(due_only=True) and time.monotonic() < deadline:
+        time.sleep(0.2)
+    left = pending_count()
+    if left:
+        print(f"[WARN] {left} notification(s) left in spool, will be sent on next start")
+
+
+atexit.register(flush)
+
+
+def _release_stale_claims():
+    if not SPOOL_DIR.exists():
+        return
+    for claimed in SPOOL_DIR.glob("*.json.claimed-*"):
+        try:
+            if time.time() - claimed.stat().st_mtime > STALE_CLAIM:
+                os.replace(claimed, SPOOL_DIR / claimed.name.split(".claimed-")[0])
+        except FileNotFoundError:
+            pass
+
+
+def _load_due():
+    """Claim every due message in the spool; returns [(claimed_path, msg)] oldest first."""
+    due = []
+    now = time.time()
+    for path in sorted(SPOOL_DIR.glob("*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                msg = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+        if msg.get("next_attempt", 0) > now:
+            continue
+        claimed = path.with_name(f"{path.name}.claimed-{os.getpid()}")
+        try:
+            # Rename is atomic, so a message is only ever sent by one process
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            continue
+        due.append((claimed, msg))
+    return due
+
+
+def _next_due_in():
+    times = []
+    for path in SPOOL_DIR.glob("*.json"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                times.append(json.load(f).get("next_attempt", 0))
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+    return max(0.0, min(times) - time.time()) if times else None
+
+
+def _release(claimed, msg, dead=False):
+    target_dir = DEAD_DIR if dead else SPOOL_DIR
+    target_dir.mkdir(parents=True, exist_ok=True)
+    with open(claimed, "w", encoding="utf-8") as f:
+        json.dump(msg, f, ensure_ascii=False)
+    os.replace(claimed, target_dir / claimed.name.split(".claimed-")[0])
+
+
+def _digest(msgs):
+    texts = list(dict.fromkeys(m["text"] for m in msgs))
+    if len(texts) == 1:
+        return texts[0]
+    text = f"<b>📦 {len(msgs)} notifications</b>"
+    for i, part in enumerate(texts):
+        # Cut between messages, never inside one, so the HTML stays valid
+        if len(text) + len(part) + 40 > MAX_MESSAGE_LEN:
+            text += f"\n\n…and {len(texts) - i} more"
+            break
+        text += "\n\n———\n\n" + part
+    return text
+
+
+class _RateLimiter:
+    def __init__(self):
+        self.sent = {}
+
+    def wait(self, chat_id):
+        history = [t for t in self.sent.get(chat_id, []) if time.monotonic() - t < 60]
+        delay = 0.0
+        if history:
+            delay = max(delay, history[-1] + NOTIFY_MIN_INTERVAL - time.monotonic())
+        if len(history) >= NOTIFY_MAX_PER_MINUTE:
+            delay = max(delay, history[-NOTIFY_MAX_PER_MINUTE] + 60 - time.monotonic())
+        if delay > 0:
+            time.sleep(delay)
+        history.append(time.monotonic())
+        self.sent[chat_id] = history
+
+
+def _send(chat_id, text):
+    """Returns (ok, retry_after, permanent)."""
+    try:
+        res = http_client.post(
+            f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
+            data={"chat_id": chat_id, "text": text, "parse_mode": "HTML"},
+            timeout=24
+        )
+    except Exception as e:
+        print(f"[WARN] Telegram send failed: {e}")
+        return False, None, False
+
+    if res.status_code == 200:
+        return True, None, False
+    try:
+        retry_after = res.json().get("parameters", {}).get("retry_after")
+    except ValueError:
+        retry_after = None
+    print(f"[WARN] Telegram returned {res.status_code}: {res.text[:200]}")
+    # Other 4xx (bad chat id, malformed HTML) will not succeed on retry
+    permanent = 400 <= res.status_code < 500 and res.status_code != 429
+    return False, retry_after, permanent
+
+
+def _run():
+    limiter = _RateLimiter()
+    while True:
+        _wake.wait(timeout=2)
+        _wake.clear()
+        if not pending_count(due_only=True):
+            continue
+
+        # Let a burst finish arriving so it can go out as one digest
+        time.sleep(NOTIFY_COALESCE_WINDOW)
+        due = _load_due()
+
+        by_chat = {}
+        for claimed, msg in due:
+            by_chat.setdefault(msg["chat_id"], []).append((claimed, msg))
+
+        for chat_id, items in by_chat.items():
+            if len(items) >= NOTIFY_DIGEST_MIN:
+                batches = [items]
+            else:
+                batches = [[item] for item in items]
+
+            for batch in batches:
+                msgs = [m for _, m in batch]
+                limiter.wait(chat_id)
+                ok, retry_after, permanent = _send(chat_id, _digest(msgs))
+                if ok:
+                    if len(batch) > 1:
+                        print(f"[SUCCESS] Telegram digest of {len(batch)} notifications sent")
+                    for claimed, _ in batch:
+                        claimed.unlink(missing_ok=True)
+                    continue
+
+                for claimed, msg in batch:
+                    msg["attempts"] += 1
+                    dead = permanent or msg["attempts"] >= NOTIFY_MAX_ATTEMPTS
+                    delay = retry_after or min(300, 2 ** msg["attempts"]) + random.random()
+                    msg["next_attempt"] = time.time() + delay
+                    _release(claimed, msg, dead=dead)
+                if permanent or all(m["attempts"] >= NOTIFY_MAX_ATTEMPTS for m in msgs):
+                    print(f"[ERROR] Gave up on {len(batch)} notification(s), moved to {DEAD_DIR}")
+
+        # Wake again when the earliest backed-off message becomes due
+        wait = _next_due_in()
+        if wait is not None and wait <= 2:
+            _wake.set()
@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import atexit
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+from . import metrics
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DATA_DIR = BASE_DIR / "data"
+PROGRESS_DIR = DATA_DIR / "progress"
+
+# Seconds between snapshot writes and terminal redraws
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "1"))
+# Snapshots not refreshed for this long belong to a process that is gone
+# (pool workers exit without atexit) and are deleted when read
+SNAPSHOT_MAX_AGE = 30
+TERMINAL_WIDTH = 160
+# Weight of the newest rate sample in the smoothed rate used for ETAs
+RATE_SMOOTHING = 0.3
+# Minimum seconds a rate sample spans, so bursts of updates don't skew it
+RATE_WINDOW = 0.5
+
+_current_job = contextvars.ContextVar("progress_job", default=None)
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_tasks = {}
+_slot = {}
+_threads = {}
+_terminal = True
+
+
+class Task:
+    """One stage of one job: done/total in unit (seconds of media, bytes...)."""
+
+    def __init__(self, job, stage, label, total=None, unit="s"):
+        self.id = f"{os.getpid()}-{next(_ids)}"
+        self.job = job
+        self.stage = stage
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.done = 0.0
+        self.rate = None
+        self.status = "running"
+        self.started = time.time()
+        self.updated = self.started
+        self._mark = (self.started, 0.0)
+
+    def update(self, done, total=None):
+        """Report absolute progress; safe to call from any thread."""
+        now = time.time()
+        with _lock:
+            if total:
+                self.total = total
+            self.done = max(self.done, done)
+            mark_time, mark_done = self._mark
+            if now - mark_time >= RATE_WINDOW:
+                sample = (self.done - mark_done) / (now - mark_time)
+                self.rate = sample if self.rate is None else (
+                    RATE_SMOOTHING * sample + (1 - RATE_SMOOTHING) * self.rate
+                )
+                self._mark = (now, self.done)
+            self.updated = now
+
+    @property
+    def fraction(self):
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+    @property
+    def eta(self):
+        if not self.total or not self.rate:
+            return None
+        return max(0.0, (self.total - self.done) / self.rate)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "job": self.job,
+            "stage": self.stage,
+            "label": self.label,
+            "done": round(self.done, 2),
+            "total": self.total,
+            "unit": self.unit,
+            "fraction": self.fraction,
+            "eta": self.eta,
+            "elapsed": round(time.time() - self.started, 1),
+            "status": self.status,
+        }
+
+
+def set_job(name):
+    """Attribute tasks started from here on in this thread (or a copied context) to job name."""
+    _current_job.set(name)
+
+
+def current_job():
+    return _current_job.get()
+
+
+@contextmanager
+def track(stage, label=None, total=None, unit="s"):
+    """Register a running stage; yields the Task so the caller can update() it."""
+    task = Task(current_job(), stage, label or stage, total, unit)
+    with _lock:
+        _tasks[task.id] = task
+    _ensure_threads()
+    try:
+        yield task
+        task.status = "done"
+    except BaseException:
+        task.status = "failed"
+        raise
+    finally:
+        with _lock:
+            _tasks.pop(task.id, None)
+        took = time.time() - task.started
+        metrics.observe("clip_stage_seconds", took, stage=task.stage, status=task.status)
+        if not _is_tty():
+            print(f"[INFO] {task.label}: {task.status} in {took:.1f}s", file=sys.stderr)
+
+
+def start_slot(slot_time, total_items):
+    with _lock:
+        _slot.clear()
+        _slot.update(slot=slot_time, total=total_items, done=0, started=time.time())
+    _ensure_threads()
+
+
+def slot_item_done():
+    with _lock:
+        if _slot:
+            _slot["done"] += 1
+
+
+def end_slot():
+    with _lock:
+        _slot.clear()
+
+
+def slot_status():
+    """Slot progress with an ETA from the average item time so far, or None."""
+    with _lock:
+        if not _slot:
+            return None
+        s = dict(_slot)
+    elapsed = time.time() - s["started"]
+    eta = None
+    if s["done"]:
+        eta = max(0.0, elapsed / s["done"] * s["total"] - elapsed)
+    return {"slot": s["slot"], "done": s["done"], "total": s["total"], "elapsed": round(elapsed, 1), "eta": eta}
+
+
+def snapshot():
+    with _lock:
+        tasks = [t.to_dict() for t in _tasks.values()]
+    return {"pid": os.getpid(), "at": time.time(), "slot": slot_status(), "tasks": tasks}
+
+
+def read_snapshots():
+    """Progress of every live process (runner, pool workers, CLI runs)."""
+    result = []
+    if not PROGRESS_DIR.exists():
+        return result
+    now = time.time()
+    for path in PROGRESS_DIR.glob("*.json"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+        if now - snap.get("at", 0) <= SNAPSHOT_MAX_AGE:
+            result.append(snap)
+        else:
+            path.unlink(missing_ok=True)
+    return result
+
+
+def disable_terminal():
+    """Pool workers only write snapshots; the runner's terminal shows their tasks."""
+    global _terminal
+    _terminal = False
+
+
+def _is_tty():
+    return _terminal and sys.stderr.isatty()
+
+
+def _snapshot_path():
+    return PROGRESS_DIR / f"{os.getpid()}.json"
+
+
+def _write_snapshot():
+    PROGRESS_DIR.mkdir(parents=True, exist_ok=True)
+    path = _snapshot_path()
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _remove_snapshot():
+    try:
+        _snapshot_path().unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _fmt_eta(seconds):
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    return f"{seconds // 60}m{seconds % 60:02d}s" if seconds >= 60 else f"{seconds}s"
+
+
+def _fmt_task(t):
+    pct = f" {t['fraction'] * 100:.0f}%" if t["fraction"] is not None else ""
+    return f"{t['label']}{pct} ETA {_fmt_eta(t['eta'])}"
+
+
+def render_line(snapshots):
+    """One status line for the terminal: slot ETA plus every running task."""
+    parts = []
+    for snap in snapshots:
+        if snap.get("slot"):
+            s = snap["slot"]
+            parts.append(f"slot {s['done']}/{s['total']} ETA {_fmt_eta(s['eta'])}")
+    tasks = [t for snap in snapshots for t in snap["tasks"]]
+    parts += [_fmt_task(t) for t in tasks]
+    return " | ".join(parts)
+
+
+def _publisher():
+    spin = itertools.cycle(["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"])
+    drawn = False
+    last_write = 0.0
+    others = []
+    while True:
+        time.sleep(0.1 if _is_tty() else PROGRESS_INTERVAL)
+        now = time.monotonic()
+        if now - last_write >= PROGRESS_INTERVAL:
+            last_write = now
+            try:
+                _write_snapshot()
+            except OSError:
+                pass
+            if _is_tty():
+                others = [s for s in read_snapshots() if s["pid"] != os.getpid()]
+        if not _is_tty():
+            continue
+
+        line = render_line([snapshot()] + others)
+        if line:
+            sys.stderr.write(f"\r\033[K[INFO] {line[:TERMINAL_WIDTH]} {next(spin)}")
+            drawn = True
+        elif drawn:
+            sys.stderr.write("\r\033[K")
+            drawn = False
+        sys.stderr.flush()
+
+
+def _ensure_threads():
+    pid = os.getpid()
+    with _lock:
+        if _threads.get(pid):
+            return
+        _threads[pid] = threading.Thread(target=_publisher, name="progress", daemon=True)
+        _threads[pid].start()
+
+
+atexit.register(_remove_snapshot)
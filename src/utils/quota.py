@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DATA_DIR = BASE_DIR / "data"
+QUOTA_DB = Path(os.getenv("QUOTA_DB", str(DATA_DIR / "quota.db")))
+
+# Reservations older than this were left by a crashed upload and are released
+QUOTA_RESERVATION_TTL = int(os.getenv("QUOTA_RESERVATION_TTL", "7200"))
+# Read-only checks may be answered from memory for this many seconds
+QUOTA_CACHE_TTL = float(os.getenv("QUOTA_CACHE_TTL", "5"))
+
+# Stats files the uploaders used before the ledger, imported once
+LEGACY_STATS = {
+    "youtube": DATA_DIR / "_upload_stats_yt.json",
+    "facebook": DATA_DIR / "_upload_stats_fb.json",
+    "instagram": DATA_DIR / "_upload_stats_ig.json",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    platform TEXT NOT NULL,
+    account TEXT NOT NULL,
+    day TEXT NOT NULL,
+    committed INTEGER NOT NULL DEFAULT 0,
+    reserved INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (platform, account, day)
+);
+CREATE TABLE IF NOT EXISTS reservations (
+    id TEXT PRIMARY KEY,
+    platform TEXT NOT NULL,
+    account TEXT NOT NULL,
+    day TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def _connect():
+    """One connection per thread and process; the schema and import run once per file."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    QUOTA_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(QUOTA_DB, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with _init_lock:
+        if QUOTA_DB not in _initialized:
+            conn.executescript(SCHEMA)
+            import_legacy_stats(conn)
+            _initialized.add(QUOTA_DB)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+class _transaction:
+    """BEGIN IMMEDIATE so check-and-reserve can't interleave with another writer."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def import_legacy_stats(conn):
+    """Copy counts from the old _upload_stats_*.json files into the ledger, once."""
+    with _transaction(conn):
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        imported = 0
+        for platform, path in LEGACY_STATS.items():
+            if not path.exists():
+                continue
+            try:
+                with open(path, "r") as f:
+                    stats = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[WARN] Could not import {path.name}: {e}")
+                continue
+            for account, acc_stats in stats.items():
+                if not acc_stats.get("date"):
+                    continue
+                conn.execute(
+                    "INSERT INTO usage (platform, account, day, committed) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (platform, account, day) DO UPDATE SET committed = MAX(committed, excluded.committed)",
+                    (platform, account, acc_stats["date"], int(acc_stats.get("count", 0)))
+                )
+                imported += 1
+        conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', ?)", (str(time.time()),))
+    if imported:
+        print(f"[INFO] Imported {imported} account counter(s) from legacy upload stats into {QUOTA_DB.name}")
+
+
+def _row(conn, platform, account, day):
+    row = conn.execute(
+        "SELECT committed, reserved FROM usage WHERE platform = ? AND account = ? AND day = ?",
+        (platform, account, day)
+    ).fetchone()
+    return row or (0, 0)
+
+
+def _remember(platform, account, day, committed, reserved):
+    with _cache_lock:
+        _cache[(platform, account, day)] = (committed, reserved, time.monotonic())
+
+
+def _expire_stale(conn):
+    cutoff = time.time() - QUOTA_RESERVATION_TTL
+    stale = conn.execute(
+        "SELECT id, platform, account, day FROM reservations WHERE created < ?", (cutoff,)
+    ).fetchall()
+    for rid, platform, account, day in stale:
+        conn.execute("DELETE FROM reservations WHERE id = ?", (rid,))
+        conn.execute(
+            "UPDATE usage SET reserved = MAX(reserved - 1, 0) WHERE platform = ? AND account = ? AND day = ?",
+            (platform, account, day)
+        )
+
+
+def usage(platform, account, day=None, fresh=False):
+    """(committed, reserved) for the day; served from memory for QUOTA_CACHE_TTL unless fresh."""
+    day = day or today()
+    if not fresh:
+        with _cache_lock:
+            hit = _cache.get((platform, account, day))
+        if hit and time.monotonic() - hit[2] < QUOTA_CACHE_TTL:
+            return hit[0], hit[1]
+    committed, reserved = _row(_connect(), platform, account, day)
+    _remember(platform, account, day, committed, reserved)
+    return committed, reserved
+
+
+def can_upload(platform, account, limit):
+    """Advisory check; reserve() is the authoritative one."""
+    committed, reserved = usage(platform, account)
+    return committed + reserved < limit
+
+
+def reserve(platform, account, limit):
+    """
+    Atomically take one of today's slots for account on platform. Returns a
+    reservation id, or None if committed + reserved uploads already reach
+    limit. Follow with commit() on success or rollback() on failure.
+    """
+    conn = _connect()
+    day = today()
+    with _transaction(conn):
+        _expire_stale(conn)
+        committed, reserved = _row(conn, platform, account, day)
+        if committed + reserved >= limit:
+            _remember(platform, account, day, committed, reserved)
+            return None
+        rid = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO reservations (id, platform, account, day, created) VALUES (?, ?, ?, ?, ?)",
+            (rid, platform, account, day, time.time())
+        )
+        conn.execute(
+            "INSERT INTO usage (platform, account, day, reserved) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (platform, account, day) DO UPDATE SET reserved = reserved + 1",
+            (platform, account, day)
+        )
+    _remember(platform, account, day, committed, reserved + 1)
+    return rid
+
+
+def _settle(rid, committed_delta):
+    conn = _connect()
+    with _transaction(conn):
+        row = conn.execute(
+            "SELECT platform, account, day FROM reservations WHERE id = ?", (rid,)
+        ).fetchone()
+        if not row:
+            # Already settled, or expired as stale
+            return row
+        platform, account, day = row
+        conn.execute("DELETE FROM reservations WHERE id = ?", (rid,))
+        conn.execute(
+            "UPDATE usage SET reserved = MAX(reserved - 1, 0), committed = committed + ? "
+            "WHERE platform = ? AND account = ? AND day = ?",
+            (committed_delta, platform, account, day)
+        )
+        committed, reserved = _row(conn, platform, account, day)
+    _remember(platform, account, day, committed, reserved)
+    return row
+
+
+def commit(rid, platform=None, account=None):
+    """
+    Turn a reservation into a counted upload. If it is gone (expired as
+    stale while the upload ran), the upload is still counted when platform
+    and account are given.
+    """
+    if _settle(rid, 1) is None and platform and account:
+        print(f"[WARN] Quota reservation {rid} expired before the upload finished, counting it anyway")
+        record(platform, account)
+
+
+def rollback(rid):
+    """Give a reservation back, e.g. when the upload failed."""
+    _settle(rid, 0)
+
+
+def record(platform, account):
+    """Count an upload that was made without a reservation."""
+    conn = _connect()
+    day = today()
+    with _transaction(conn):
+        conn.execute(
+            "INSERT INTO usage (platform, account, day, committed) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (platform, account, day) DO UPDATE SET committed = committed + 1",
+            (platform, account, day)
+        )
+        committed, reserved = _row(conn, platform, account, day)
+    _remember(platform, account, day, committed, reserved)
+
+
+def run_reserved(platform, account, limit, upload_fn, *args):
+    """
+    Reserve a slot, run upload_fn(*args) and commit the slot if it returned
+    a result, otherwise (None or an exception) give it back. Returns
+    (reserved, result); reserved is False when the daily limit was reached.
+    """
+    rid = reserve(platform, account, limit)
+    if rid is None:
+        return False, None
+    try:
+        res = upload_fn(*args)
+    except BaseException:
+        rollback(rid)
+        raise
+    if res:
+        commit(rid, platform, account)
+    else:
+        rollback(rid)
+    return True, res
@@ -0,0 +1,160 @@
+import os
+import time
+import heapq
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+from utils import job_store
+
+load_dotenv()
+
+SLOT_FORMAT = job_store.DATE_FORMAT
+
+# Upper bound on one sleep, so wall-clock jumps (NTP, DST) are noticed
+SCHEDULER_MAX_SLEEP = float(os.getenv("SCHEDULER_MAX_SLEEP", "300"))
+# How often file changes are checked when inotify is not available
+SCHEDULER_POLL = float(os.getenv("CHECK_INTERVAL", "30"))
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def parse_slot_time(date_str):
+    """Slot "YYYY-MM-DD,HH:MM" as a local datetime, or None if malformed."""
+    try:
+        return datetime.strptime(date_str.strip(), SLOT_FORMAT)
+    except (AttributeError, ValueError):
+        return None
+
+
+class _Inotify:
+    """Minimal inotify watch on a directory through libc, Linux only."""
+
+    def __init__(self, directory, names):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if libc.inotify_add_watch(self.fd, str(directory).encode(), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+        self.names = set(names)
+
+    def wait(self, timeout=None):
+        """Block until one of the watched names changes (True) or timeout (False)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        offset = 0
+        hit = False
+        while offset + _EVENT_HEADER.size <= len(buf):
+            _, _, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+            name = buf[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0").decode(errors="replace")
+            offset += _EVENT_HEADER.size + length
+            if name in self.names:
+                hit = True
+        return hit
+
+
+class SlotScheduler:
+    """
+    Sleeps until the earliest pending slot instead of polling.
+
+    Pending slot times from the job store are kept in a heap. wait() blocks
+    until the head of the heap is due, a watched file (_jobs.json or the
+    job store's wake file) changes, or an optional earlier deadline such as
+    midnight. Changes are picked up by an inotify watcher thread, with an
+    mtime poll every CHECK_INTERVAL where inotify is unavailable.
+    """
+
+    def __init__(self, watch_files=(job_store.JOBS_JSON, job_store.WAKE_FILE)):
+        self.watch_files = [Path(p) for p in watch_files]
+        self._heap = []
+        self._changed = threading.Event()
+        self._watcher = None
+        self.reload()
+
+    def start(self):
+        self._watcher = threading.Thread(target=self._watch, name="slot-watcher", daemon=True)
+        self._watcher.start()
+
+    def reload(self):
+        heap = []
+        for date_str in job_store.pending_dates():
+            due = parse_slot_time(date_str)
+            if due is None:
+                print(f"[WARN] Ignoring slot with malformed date: {date_str!r}")
+                continue
+            heap.append((due.timestamp(), date_str))
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def next_due(self):
+        """(timestamp, date_str) of the earliest pending slot, or None."""
+        return self._heap[0] if self._heap else None
+
+    def wait(self, deadline=None):
+        """
+        Sleep until the next slot is due, a watched file changes or deadline
+        (a timestamp) passes. Returns True if woken by a change.
+        """
+        targets = [t for t in (deadline, self._heap[0][0] if self._heap else None) if t is not None]
+        timeout = SCHEDULER_MAX_SLEEP
+        if targets:
+            timeout = max(0.0, min(min(targets) - time.time(), SCHEDULER_MAX_SLEEP))
+        changed = self._changed.wait(timeout)
+        if changed:
+            self._changed.clear()
+            self.reload()
+        return changed
+
+    def _watch(self):
+        directories = {p.parent for p in self.watch_files}
+        if len(directories) == 1:
+            directory = directories.pop()
+            directory.mkdir(parents=True, exist_ok=True)
+            try:
+                watcher = _Inotify(directory, [p.name for p in self.watch_files])
+            except (OSError, AttributeError) as e:
+                print(f"[WARN] inotify unavailable ({e}), checking for job changes every {SCHEDULER_POLL:.0f}s")
+            else:
+                while True:
+                    if watcher.wait():
+                        self._changed.set()
+
+        mtimes = {p: self._mtime(p) for p in self.watch_files}
+        while True:
+            time.sleep(SCHEDULER_POLL)
+            for p in self.watch_files:
+                current = self._mtime(p)
+                if current != mtimes[p]:
+                    mtimes[p] = current
+                    self._changed.set()
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+def next_midnight():
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    return datetime.combine(tomorrow, datetime.min.time()).timestamp()
@@ -1,5 +1,5 @@
 import os
-import requests
+from utils import notify_queue
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,22 +23,11 @@ def send_to_telegram(title, account, platform, link=None):
     if link:
         text += f"\n<b>🔗 Link:</b> {link}"
     
-    url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
-    
-    payload = {
-        "chat_id": CHAT_ID, 
-        "text": text,
-        "parse_mode": "HTML"
-    }
-
-    try:
-        response = requests.post(url, data=payload, timeout=24)
-        response.raise_for_status()
-        print(f"\n[SUCCESS] Telegram notification sent for {platform}")
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"\n[ERROR] Failed to send to Telegram: {e}")
-        return False
+    # Queued so a slow Telegram API never holds up the upload
+    queued = notify_queue.enqueue(text, CHAT_ID)
+    if queued:
+        print(f"\n[INFO] Telegram notification queued for {platform}")
+    return queued
 
 def send_job_notification(title, account, status="completed", error_msg=None):
     """Send Telegram notification for job status."""
@@ -64,18 +53,4 @@ def send_job_notification(title, account, status="completed", error_msg=None):
         f"<b>Account:</b> {account}"
     )
     
-    url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
-    
-    payload = {
-        "chat_id": CHAT_ID, 
-        "text": text,
-        "parse_mode": "HTML"
-    }
-
-    try:
-        response = requests.post(url, data=payload, timeout=24)
-        response.raise_for_status()
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"\n[ERROR] Failed to send job notification: {e}")
-        return False
+    return notify_queue.enqueue(text, CHAT_ID)
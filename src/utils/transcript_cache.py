@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DATA_DIR = BASE_DIR / "data"
+TRANSCRIPT_DIR = DATA_DIR / "transcripts"
+LOCK_FILE = TRANSCRIPT_DIR / ".lock"
+
+TRANSCRIPT_CACHE = os.getenv("TRANSCRIPT_CACHE", "1") == "1"
+# Entries unused for this many days are removed, then the least recently
+# used ones until the cache fits TRANSCRIPT_CACHE_MB
+TRANSCRIPT_CACHE_DAYS = float(os.getenv("TRANSCRIPT_CACHE_DAYS", "30"))
+TRANSCRIPT_CACHE_MB = float(os.getenv("TRANSCRIPT_CACHE_MB", "200"))
+
+# Gaps shorter than this are not worth a Whisper call
+MIN_GAP = 0.3
+# Extra audio decoded on each side of a gap so words on its edges aren't cut
+GAP_CONTEXT = 1.0
+
+_lock = threading.Lock()
+
+
+def youtube_video_id(url):
+    parsed = urlparse(url or "")
+    host = parsed.netloc.lower()
+    if host.endswith("youtu.be"):
+        return parsed.path.strip("/").split("/")[0] or None
+    if "youtube" in host:
+        qs = parse_qs(parsed.query)
+        if "v" in qs:
+            return qs["v"][0]
+        match = re.match(r"/(shorts|live|embed)/([\w-]+)", parsed.path)
+        if match:
+            return match.group(2)
+    return None
+
+
+def local_file_hash(path, sample=1 << 20):
+    """Cheap content hash: size plus the first and last MiB of the file."""
+    path = Path(path)
+    size = path.stat().st_size
+    h = hashlib.sha1(str(size).encode("utf-8"))
+    with open(path, "rb") as f:
+        h.update(f.read(sample))
+        if size > sample:
+            f.seek(max(sample, size - sample))
+            h.update(f.read(sample))
+    return h.hexdigest()
+
+
+def source_identity(args):
+    """Stable id of the source video: YouTube video id or local file hash."""
+    if args.local:
+        return f"file:{local_file_hash(args.local)}"
+    video_id = youtube_video_id(args.url)
+    if video_id:
+        return f"yt:{video_id}"
+    return f"url:{hashlib.sha1(args.url.encode('utf-8')).hexdigest()}"
+
+
+def _entry_path(source_id, settings):
+    key = hashlib.sha1(f"{source_id}|{settings}".encode("utf-8")).hexdigest()[:16]
+    return TRANSCRIPT_DIR / f"{key}.json"
+
+
+@contextmanager
+def _locked():
+    """Serialize read-modify-write of entries across threads and pool processes."""
+    TRANSCRIPT_DIR.mkdir(parents=True, exist_ok=True)
+    with _lock, open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def prune():
+    """Drop entries unused for TRANSCRIPT_CACHE_DAYS, then the oldest beyond TRANSCRIPT_CACHE_MB."""
+    entries = []
+    for path in TRANSCRIPT_DIR.glob("*.json"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    entries.sort(reverse=True)
+
+    cutoff = time.time() - TRANSCRIPT_CACHE_DAYS * 86400
+    budget = TRANSCRIPT_CACHE_MB * 1024 * 1024
+    total = 0
+    removed = 0
+    # The most recently used entry (the one just written) is always kept
+    for i, (mtime, size, path) in enumerate(entries):
+        total += size
+        if i and (mtime < cutoff or total > budget):
+            path.unlink(missing_ok=True)
+            removed += 1
+    if removed:
+        print(f"[INFO] Transcript cache: removed {removed} old entr{'y' if removed == 1 else 'ies'}")
+
+
+def load_entry(source_id, settings):
+    try:
+        with open(_entry_path(source_id, settings), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"source": source_id, "settings": settings, "intervals": [], "words": []}
+
+
+def save_entry(entry):
+    path = _entry_path(entry["source"], entry["settings"])
+    TRANSCRIPT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_intervals(intervals, start, end):
+    """Parts of [start, end] not covered by the (merged) cached intervals."""
+    gaps = []
+    cursor = start
+    for cov_start, cov_end in merge_intervals(intervals):
+        if cov_end <= cursor:
+            continue
+        if cov_start >= end:
+            break
+        if cov_start > cursor:
+            gaps.append((cursor, cov_start))
+        cursor = max(cursor, cov_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return [(s, e) for s, e in gaps if e - s >= MIN_GAP]
+
+
+def _words_in(words, start, end):
+    # A word belongs to the range its midpoint falls in
+    return [w for w in words if start <= (w["start"] + w["end"]) / 2 < end]
+
+
+def transcribe_cached(source_id, settings, start, end, audio, transcribe_fn, sample_rate=16000):
+    """
+    Return segments for [start, end] (absolute source seconds) whose word
+    timings are relative to start, as build_ass expects.
+
+    audio holds the PCM of exactly [start, end]. Only the ranges not already
+    in the cache are passed to transcribe_fn(audio_slice), whose word timings
+    are re-based and stored for later clips of the same source.
+    """
+    with _locked():
+        entry = load_entry(source_id, settings)
+        path = _entry_path(source_id, settings)
+        if path.exists():
+            # mtime marks last use for prune()
+            os.utime(path)
+
+    gaps = missing_intervals(entry["intervals"], start, end)
+    if gaps:
+        covered = (end - start) - sum(e - s for s, e in gaps)
+        print(f"\n[INFO] Transcript cache: {covered:.1f}s cached, transcribing {len(gaps)} gap(s)")
+    else:
+        print("\n[INFO] Transcript cache: clip fully covered")
+
+    new_words = []
+    for gap_start, gap_end in gaps:
+        slice_start = max(start, gap_start - GAP_CONTEXT)
+        slice_end = min(end, gap_end + GAP_CONTEXT)
+        chunk = audio[int((slice_start - start) * sample_rate):int((slice_end - start) * sample_rate)]
+
+        words = [
+            {"start": w.start + slice_start, "end": w.end + slice_start, "word": w.word}
+            for seg in transcribe_fn(chunk)
+            for w in (seg.words or [])
+        ]
+        new_words += _words_in(words, gap_start, gap_end)
+
+    if gaps:
+        with _locked():
+            # Reload so entries written by other jobs meanwhile are kept
+            entry = load_entry(source_id, settings)
+            kept = [
+                w for w in entry["words"]
+                if not any(_words_in([w], s, e) for s, e in gaps)
+            ]
+            entry["words"] = sorted(kept + new_words, key=lambda w: w["start"])
+            entry["intervals"] = merge_intervals(entry["intervals"] + [list(g) for g in gaps])
+            save_entry(entry)
+            prune()
+
+    words = [
+        SimpleNamespace(start=w["start"] - start, end=w["end"] - start, word=w["word"])
+        for w in _words_in(entry["words"], start, end)
+    ]
+    return [SimpleNamespace(
+        start=0.0,
+        end=end - start,
+        text="".join(w.word for w in words),
+        words=words
+    )]
@@ -1,22 +1,125 @@
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dotenv import load_dotenv
+from utils import metrics
 from utils.accounts import has_account
 from utils.uploader.youtube import upload_youtube
 from utils.uploader.facebook import upload_facebook
 from utils.uploader.instagram import upload_instagram
 
-def upload_by_account(video_path, title, desc, source, account):
+load_dotenv()
+
+PLATFORMS = ("youtube", "facebook", "instagram")
+
+# Seconds each platform may take, including Meta's processing wait
+UPLOAD_TIMEOUTS = {
+    "youtube": int(os.getenv("UPLOAD_TIMEOUT_YOUTUBE", "900")),
+    "facebook": int(os.getenv("UPLOAD_TIMEOUT_FACEBOOK", "600")),
+    "instagram": int(os.getenv("UPLOAD_TIMEOUT_INSTAGRAM", "600")),
+}
+
+# Uploads that outlived their timeout, by (platform, account, video path). A
+# retry of the same video waits on these instead of starting a second upload
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+LINK_FORMATS = {
+    "youtube": "https://youtu.be/{id}",
+    "facebook": "https://www.facebook.com/reels/{id}",
+    "instagram": "https://www.instagram.com/reels/{id}/",
+}
+
+def _timed_upload(platform, uploader, args, on_uploaded, cancel):
+    started = time.monotonic()
+    res = uploader(*args, cancel=cancel)
+    latency = time.monotonic() - started
+    if res and on_uploaded:
+        on_uploaded(platform, res)
+    return res, latency
+
+def upload_by_account(video_path, title, desc, source, account, skip=(), on_uploaded=None):
+    """
+    Upload to every platform the account is set up for (except those in skip)
+    concurrently, each bounded by its own timeout.
+
+    Returns {platform: {"status", "latency", "link", "response", "error"}} where
+    status is "success", "failed" (uploader gave up or hit its daily limit),
+    "error" (uploader raised) or "timeout". on_uploaded(platform, response) is
+    called as soon as each upload succeeds.
+
+    A timed-out upload is asked to stop at its next chunk or status poll. If
+    it is still running when the same video is uploaded again, that call
+    waits for it rather than starting a second upload (and a duplicate post).
+    """
     final_desc = f"""{desc}
 
 Source:
 {source}
 """
 
+    uploaders = {
+        "youtube": upload_youtube,
+        "facebook": upload_facebook,
+        "instagram": upload_instagram,
+    }
+
     print(f"\n[INFO] Processing account: {account}")
-    
-    if has_account(account, "youtube"):
-        upload_youtube(video_path, title, final_desc, account)
-    
-    if has_account(account, "facebook"):
-        upload_facebook(video_path, title, final_desc, account)
-    
-    if has_account(account, "instagram"):
-        upload_instagram(video_path, title, final_desc, account)
+
+    # Account checks may start an interactive OAuth flow, so keep them serial
+    platforms = [p for p in PLATFORMS if p not in skip and has_account(account, p)]
+    if not platforms:
+        return {}
+
+    pool = ThreadPoolExecutor(max_workers=len(platforms), thread_name_prefix="upload")
+    started = time.monotonic()
+    futures = {}
+    cancels = {}
+    with _in_flight_lock:
+        for platform in platforms:
+            key = (platform, account, str(video_path))
+            earlier = _in_flight.pop(key, None)
+            if earlier and not earlier[0].done():
+                print(f"[INFO] {platform} upload from an earlier attempt is still running, waiting for it")
+                futures[platform], cancels[platform] = earlier
+                continue
+            cancels[platform] = threading.Event()
+            # Copied context so each upload's progress is attributed to the current job
+            futures[platform] = pool.submit(
+                contextvars.copy_context().run, _timed_upload, platform, uploaders[platform],
+                (video_path, title, final_desc, account), on_uploaded, cancels[platform]
+            )
+
+    results = {}
+    for platform, future in futures.items():
+        result = {"status": "failed", "latency": None, "link": None, "response": None, "error": None}
+        remaining = max(0.0, started + UPLOAD_TIMEOUTS[platform] - time.monotonic())
+        try:
+            res, latency = future.result(timeout=remaining)
+            result["latency"] = round(latency, 1)
+            if res:
+                result["status"] = "success"
+                result["response"] = res
+                if res.get("id"):
+                    result["link"] = LINK_FORMATS[platform].format(id=res["id"])
+        except FutureTimeout:
+            result["status"] = "timeout"
+            result["latency"] = round(time.monotonic() - started, 1)
+            result["error"] = f"no result after {UPLOAD_TIMEOUTS[platform]}s, stopping it"
+            cancels[platform].set()
+            with _in_flight_lock:
+                _in_flight[(platform, account, str(video_path))] = (future, cancels[platform])
+        except Exception as e:
+            result["status"] = "error"
+            result["latency"] = round(time.monotonic() - started, 1)
+            result["error"] = str(e)
+        results[platform] = result
+        metrics.inc("clip_uploads_total", platform=platform, status=result["status"])
+        if result["latency"] is not None:
+            metrics.observe("clip_upload_seconds", result["latency"], platform=platform, status=result["status"])
+
+    # A timed-out upload runs on until its next cancel check; don't wait for it
+    pool.shutdown(wait=False, cancel_futures=True)
+    return results
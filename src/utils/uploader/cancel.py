@@ -0,0 +1,8 @@
+class UploadCancelled(Exception):
+    """upload_by_account gave up waiting for this upload and asked it to stop."""
+
+
+def check_cancelled(cancel, label):
+    """Raise UploadCancelled if the cancel Event (may be None) is set."""
+    if cancel is not None and cancel.is_set():
+        raise UploadCancelled(f"{label} upload cancelled after its timeout")
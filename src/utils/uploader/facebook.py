@@ -1,111 +1,92 @@
-import json
-import time
-import requests
-from datetime import datetime
 from pathlib import Path
 from auth.meta import get_page_token
+from utils import quota
 from utils.telegram import send_to_telegram
+from utils.uploader.rupload import rupload_file, committed_offset, resume_offset, RUPLOAD_URL
+from utils.uploader.graph import graph_post
+from utils.uploader.status_poller import wait_for_status
+from utils.uploader.cancel import UploadCancelled, check_cancelled
+from utils.uploader.sessions import session_key, load_session, save_session, clear_session
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-UPLOAD_LOG = DATA_DIR / "_upload_stats_fb.json"
 MAX_DAILY_FB = 10
 
 def can_upload_fb(account):
-    if not UPLOAD_LOG.exists():
-        return True
-    
-    with open(UPLOAD_LOG, 'r') as f:
-        stats = json.load(f)
-    
-    today = datetime.now().strftime("%Y-%m-%d")
-    acc_stats = stats.get(account, {})
-    
-    if acc_stats.get("date") == today:
-        return acc_stats.get("count", 0) < MAX_DAILY_FB
-    return True
+    return quota.can_upload("facebook", account, MAX_DAILY_FB)
 
 def update_fb_count(account):
-    stats = {}
-    if UPLOAD_LOG.exists():
-        with open(UPLOAD_LOG, 'r') as f:
-            stats = json.load(f)
-    
-    today = datetime.now().strftime("%Y-%m-%d")
-    if account not in stats or stats[account].get("date") != today:
-        stats[account] = {"date": today, "count": 1}
-    else:
-        stats[account]["count"] += 1
-        
-    with open(UPLOAD_LOG, 'w') as f:
-        json.dump(stats, f, indent=4)
+    quota.record("facebook", account)
 
-def wait_for_fb_reels_ready(video_id, token):
-    url = f"https://graph.facebook.com/v18.0/{video_id}"
-    params = {
-        "fields": "status",
-        "access_token": token
-    }
-    
-    for _ in range(30):
-        res = requests.get(url, params=params).json()
-        status = res.get("status", {}).get("video_status")
-        
-        if status == "ready":
-            return True
-        elif status == "failed":
-            print(f"[ERROR] FB Processing failed: {res}")
-            return False
-            
-        time.sleep(10)
-    return False
+def fb_reel_status(res):
+    status = res.get("status", {}).get("video_status")
+    if status == "ready":
+        return True
+    if status in ("failed", "error"):
+        print(f"[ERROR] FB Processing failed: {res}")
+        return False
+    return None
 
-def upload_facebook(video_path, title, description, account):
-    if not can_upload_fb(account):
-        print(f"[SKIP] Facebook {account} has reached daily limit.")
-        return None
+def wait_for_fb_reels_ready(video_id, token, cancel=None):
+    ready, _ = wait_for_status(video_id, token, "status", fb_reel_status, cancel=cancel)
+    return bool(ready)
 
+def _upload_facebook(video_path, title, description, account, cancel=None):
     page_id, token = get_page_token(account)
     
+    key = session_key("facebook", account, video_path)
+
     try:
-        start_url = f"https://graph.facebook.com/v18.0/{page_id}/video_reels"
-        payload = {
-            "upload_phase": "start",
-            "access_token": token
-        }
-        start_res = requests.post(start_url, data=payload).json()
-        video_id = start_res.get("video_id")
+        # Resume a reel whose upload was interrupted on an earlier attempt
+        session = load_session(key)
+        if session:
+            video_id = session["video_id"]
+            offset = resume_offset(lambda: committed_offset(video_id, token), session.get("offset", 0), "Facebook")
+            print(f"[INFO] Resuming Facebook upload for {account} at byte {offset}")
+        else:
+            start_res = graph_post(f"{page_id}/video_reels", token, upload_phase="start").json()
+            video_id = start_res.get("video_id")
 
-        if not video_id:
-            print(f"[ERROR] Could not initialize FB Reel: {start_res}")
-            return None
+            if not video_id:
+                print(f"[ERROR] Could not initialize FB Reel: {start_res}")
+                return None
+            offset = 0
+            save_session(key, {"video_id": video_id, "offset": 0})
 
-        upload_url = f"https://rupload.facebook.com/video-reels/{video_id}"
-        with open(video_path, "rb") as f:
-            upload_headers = {
-                "Authorization": f"OAuth {token}",
-                "offset": "0",
-                "file_size": str(Path(video_path).stat().st_size),
-                "Content-Type": "application/octet-stream"
-            }
-            requests.post(upload_url, data=f, headers=upload_headers).raise_for_status()
+        rupload_file(
+            f"{RUPLOAD_URL}/video-reels/{video_id}",
+            token,
+            video_path,
+            offset=offset,
+            committed_offset=lambda: committed_offset(video_id, token),
+            on_progress=lambda sent, size: save_session(key, {"video_id": video_id, "offset": sent}),
+            label="Facebook",
+            cancel=cancel
+        )
 
-        publish_url = f"https://graph.facebook.com/v18.0/{page_id}/video_reels"
-        publish_payload = {
-            "upload_phase": "finish",
-            "video_id": video_id,
-            "video_state": "PUBLISHED",
-            "description": f"{title}\n\n{description}",
-            "access_token": token
-        }
-        requests.post(publish_url, data=publish_payload).raise_for_status()
+        # Last point to stop: after finish the reel is public
+        check_cancelled(cancel, "Facebook")
+        graph_post(
+            f"{page_id}/video_reels",
+            token,
+            upload_phase="finish",
+            video_id=video_id,
+            video_state="PUBLISHED",
+            description=f"{title}\n\n{description}"
+        ).raise_for_status()
+        clear_session(key)
 
         print(f"[INFO] Waiting for Facebook to process Reel...")
-        if wait_for_fb_reels_ready(video_id, token):
+        try:
+            ready = wait_for_fb_reels_ready(video_id, token, cancel)
+        except UploadCancelled:
+            # Already published; report it so a retry doesn't post it again
+            print(f"[WARN] Facebook Reel {video_id} published, processing not confirmed")
+            return {"id": video_id}
+        if ready:
             print(f"[SUCCESS] Reel published on Facebook for {account}")
-            update_fb_count(account)
             
             fb_link = f"https://www.facebook.com/reels/{video_id}"
             send_to_telegram(title=title, account=account, platform="Facebook", link=fb_link)
@@ -113,4 +94,16 @@ def upload_facebook(video_path, title, description, account):
             
     except Exception as e:
         print(f"[ERROR] Facebook upload failed for {account}: {e}")
+        # Let the caller retry while the interrupted reel can still be resumed
+        if load_session(key):
+            raise
         return None
+
+def upload_facebook(video_path, title, description, account, cancel=None):
+    # The daily slot is reserved up front and only counted if the upload succeeds
+    reserved, res = quota.run_reserved(
+        "facebook", account, MAX_DAILY_FB, _upload_facebook, video_path, title, description, account, cancel
+    )
+    if not reserved:
+        print(f"[SKIP] Facebook {account} has reached daily limit.")
+    return res
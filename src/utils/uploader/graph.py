@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import threading
+import requests
+from urllib.parse import urlencode
+from urllib3.exceptions import NewConnectionError
+from dotenv import load_dotenv
+from utils import http_client
+from utils.uploader.rupload import GRAPH_URL
+
+load_dotenv()
+
+GRAPH_BATCH = os.getenv("GRAPH_BATCH", "1") == "1"
+# How long a call waits for others to share its batch request
+GRAPH_BATCH_WINDOW = float(os.getenv("GRAPH_BATCH_WINDOW", "0.25"))
+# Graph API limit on calls per batch request
+MAX_BATCH_SIZE = 50
+
+
+def _never_sent(e):
+    """True if e was raised while connecting (timeout, refused, DNS), before any bytes reached Meta."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    if not isinstance(e, requests.ConnectionError) or not e.args:
+        return False
+    reason = getattr(e.args[0], "reason", e.args[0])
+    return isinstance(reason, NewConnectionError)
+
+
+class GraphResponse:
+    """The parts of requests.Response the uploaders use, for batched and direct calls alike."""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text or ""
+
+    def json(self):
+        try:
+            return json.loads(self.text)
+        except ValueError:
+            return {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"Graph API {self.status_code}: {self.text}")
+
+
+class _Call:
+    def __init__(self, method, path, token, params):
+        self.method = method.upper()
+        self.path = str(path).lstrip("/")
+        self.params = dict(params or {}, access_token=token)
+        self.response = None
+        self.done = threading.Event()
+
+
+class GraphClient:
+    """
+    Meta Graph API client that coalesces independent calls into batch requests.
+
+    call() queues a request; the first caller of a window waits
+    GRAPH_BATCH_WINDOW for others (status checks, publishes from other
+    uploads in this process) and sends everything queued as one
+    POST batch=[...]. call_many() sends a known list in one go. Each call
+    carries its own access_token, so calls for different accounts share a
+    batch. A failed batch falls back to direct requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self.calls = 0
+        self.requests_sent = 0
+
+    @property
+    def saved_round_trips(self):
+        return self.calls - self.requests_sent
+
+    def call(self, method, path, token, params=None):
+        c = _Call(method, path, token, params)
+        if not GRAPH_BATCH:
+            self._send([c])
+            return c.response
+
+        with self._lock:
+            self._pending.append(c)
+            leader = len(self._pending) == 1
+        if leader:
+            time.sleep(GRAPH_BATCH_WINDOW)
+            with self._lock:
+                calls, self._pending = self._pending, []
+            self._send(calls)
+        c.done.wait()
+        return c.response
+
+    def call_many(self, calls):
+        """Send [(method, path, token, params), ...] together; returns responses in order."""
+        queued = [_Call(*args) for args in calls]
+        self._send(queued)
+        return [c.response for c in queued]
+
+    def _send(self, calls):
+        for i in range(0, len(calls), MAX_BATCH_SIZE):
+            chunk = calls[i:i + MAX_BATCH_SIZE]
+            if len(chunk) == 1 or not GRAPH_BATCH:
+                for c in chunk:
+                    self._direct(c)
+            else:
+                self._batch(chunk)
+            for c in chunk:
+                c.done.set()
+
+    def _direct(self, c):
+        with self._lock:
+            self.calls += 1
+            self.requests_sent += 1
+        try:
+            if c.method == "GET":
+                res = http_client.get(f"{GRAPH_URL}/{c.path}", params=c.params, timeout=60)
+            else:
+                res = http_client.request(c.method, f"{GRAPH_URL}/{c.path}", data=c.params, timeout=60)
+            c.response = GraphResponse(res.status_code, res.text)
+        except requests.RequestException as e:
+            c.response = GraphResponse(599, json.dumps({"error": {"message": str(e)}}))
+
+    def _resend_or_fail(self, c, unsent, reason):
+        """Re-send a call on its own if that is safe (a GET, or never sent), else fail it."""
+        if c.method == "GET" or unsent:
+            self._direct(c)
+        else:
+            message = f"{reason}; {c.method} {c.path} not re-sent, it may have been applied"
+            c.response = GraphResponse(599, json.dumps({"error": {"message": message}}))
+
+    def _batch(self, calls):
+        batch = []
+        for c in calls:
+            if c.method == "GET":
+                batch.append({"method": "GET", "relative_url": f"{c.path}?{urlencode(c.params)}"})
+            else:
+                batch.append({"method": c.method, "relative_url": c.path, "body": urlencode(c.params)})
+
+        try:
+            res = http_client.post(
+                GRAPH_URL,
+                data={"batch": json.dumps(batch), "access_token": calls[0].params["access_token"]},
+                timeout=90
+            )
+            res.raise_for_status()
+            results = res.json()
+        except (requests.RequestException, ValueError) as e:
+            # Only a failed connect proves Meta never saw the batch; otherwise
+            # POSTs (publish, finish) may have run and must not be sent twice
+            unsent = _never_sent(e)
+            print(f"[WARN] Graph batch of {len(calls)} failed ({e}), re-sending {'all calls' if unsent else 'GETs'} individually")
+            for c in calls:
+                self._resend_or_fail(c, unsent, f"batch request failed: {e}")
+            return
+
+        with self._lock:
+            self.calls += len(calls)
+            self.requests_sent += 1
+        print(f"[INFO] Graph batch: {len(calls)} calls in 1 request ({self.saved_round_trips} round trips saved so far)")
+
+        if not isinstance(results, list) or len(results) != len(calls):
+            print(f"[WARN] Graph batch of {len(calls)} returned {len(results) if isinstance(results, list) else 'no'} results")
+            results = results if isinstance(results, list) else []
+        for i, c in enumerate(calls):
+            item = results[i] if i < len(results) else None
+            if not isinstance(item, dict):
+                # Meta drops items it could not finish in time, possibly after running them
+                self._resend_or_fail(c, False, "no result in batch response")
+            else:
+                c.response = GraphResponse(item.get("code", 500), item.get("body"))
+
+
+client = GraphClient()
+
+
+def graph_get(path, token, **params):
+    return client.call("GET", path, token, params)
+
+
+def graph_post(path, token, **params):
+    return client.call("POST", path, token, params)
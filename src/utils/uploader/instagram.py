@@ -1,107 +1,131 @@
-import json
-import time
-import requests
-from datetime import datetime
+import os
 from pathlib import Path
+from dotenv import load_dotenv
 from auth.meta import get_ig_token
+from utils import quota
 from utils.telegram import send_to_telegram
+from utils.uploader.rupload import rupload_file, rupload_offset, resume_offset, RUPLOAD_URL
+from utils.uploader.graph import graph_post
+from utils.uploader.status_poller import wait_for_status
+from utils.uploader.cancel import check_cancelled
+from utils.uploader.sessions import session_key, load_session, save_session, clear_session
+
+load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-UPLOAD_LOG = DATA_DIR / "_upload_stats_ig.json"
 MAX_DAILY_REELS = 10 
 
+# "resumable" streams local files to rupload; "url" lets Meta fetch video_url itself
+IG_UPLOAD_MODE = os.getenv("IG_UPLOAD_MODE", "resumable")
+
 def can_upload_ig(account):
-    if not UPLOAD_LOG.exists():
-        return True
-    
-    with open(UPLOAD_LOG, 'r') as f:
-        stats = json.load(f)
-    
-    today = datetime.now().strftime("%Y-%m-%d")
-    acc_stats = stats.get(account, {})
-    
-    if acc_stats.get("date") == today:
-        return acc_stats.get("count", 0) < MAX_DAILY_REELS
-    return True
+    return quota.can_upload("instagram", account, MAX_DAILY_REELS)
 
 def update_ig_count(account):
-    stats = {}
-    if UPLOAD_LOG.exists():
-        with open(UPLOAD_LOG, 'r') as f:
-            stats = json.load(f)
-    
-    today = datetime.now().strftime("%Y-%m-%d")
-    if account not in stats or stats[account].get("date") != today:
-        stats[account] = {"date": today, "count": 1}
+    quota.record("instagram", account)
+
+def ig_container_status(res):
+    status = res.get("status_code")
+    if status in ("FINISHED", "PUBLISHED"):
+        return True
+    if status in ("ERROR", "EXPIRED"):
+        print(f"[ERROR] Meta processing failed: {res}")
+        return False
+    return None
+
+def wait_for_media_ready(container_id, token, cancel=None):
+    ready, _ = wait_for_status(container_id, token, "status_code", ig_container_status, cancel=cancel)
+    return bool(ready)
+
+def create_resumable_container(video_path, caption, account, ig_user_id, token, cancel=None):
+    """
+    Create a REELS container with upload_type=resumable and stream the file's
+    bytes to it in chunks, so Meta never has to fetch a public URL. Returns
+    the container id once all bytes are committed.
+    """
+    key = session_key("instagram", account, video_path)
+    session = load_session(key)
+
+    if session:
+        container_id = session["container_id"]
+        upload_url = session["upload_url"]
+        offset = resume_offset(lambda: rupload_offset(upload_url, token), session.get("offset", 0), "Instagram")
+        print(f"[INFO] Resuming Instagram upload for {account} at byte {offset}")
     else:
-        stats[account]["count"] += 1
-        
-    with open(UPLOAD_LOG, 'w') as f:
-        json.dump(stats, f, indent=4)
-
-def wait_for_media_ready(container_id, token):
-    url = f"https://graph.facebook.com/v18.0/{container_id}"
-    params = {"fields": "status_code", "access_token": token}
-    
-    for _ in range(30):
-        res = requests.get(url, params=params).json()
-        status = res.get("status_code")
-        
-        if status == "FINISHED":
-            return True
-        elif status == "ERROR":
-            print(f"[ERROR] Meta processing failed: {res}")
-            return False
-            
-        time.sleep(10)
-    return False
-
-def upload_instagram(video_url, title, description, account):
-    if not can_upload_ig(account):
-        print(f"[SKIP] Instagram {account} has reached daily Reels limit.")
-        return None
+        create_data = graph_post(
+            f"{ig_user_id}/media",
+            token,
+            media_type="REELS",
+            upload_type="resumable",
+            caption=caption
+        ).json()
+        if "id" not in create_data:
+            print(f"[ERROR] Container creation failed: {create_data}")
+            return None
 
+        container_id = create_data["id"]
+        upload_url = create_data.get("uri") or f"{RUPLOAD_URL}/ig-api-upload/v18.0/{container_id}"
+        offset = 0
+        save_session(key, {"container_id": container_id, "upload_url": upload_url, "offset": 0})
+
+    try:
+        rupload_file(
+            upload_url,
+            token,
+            video_path,
+            offset=offset,
+            committed_offset=lambda: rupload_offset(upload_url, token),
+            on_progress=lambda sent, size: save_session(
+                key, {"container_id": container_id, "upload_url": upload_url, "offset": sent}
+            ),
+            label="Instagram",
+            cancel=cancel
+        )
+    except Exception as e:
+        # Session stays on record, so the next attempt resumes this container
+        print(f"[ERROR] Instagram upload interrupted for {account}: {e}")
+        raise
+
+    clear_session(key)
+    return container_id
+
+def _upload_instagram(video_url, title, description, account, cancel=None):
     ig_user_id, token = get_ig_token(account)
 
-    create_res = requests.post(
-        f"https://graph.facebook.com/v18.0/{ig_user_id}/media",
-        data={
-            "media_type": "REELS",
-            "video_url": video_url,
-            "caption": f"{title}\n\n{description}",
-            "access_token": token
-        },
-        timeout=60
-    )
-    
-    create_data = create_res.json()
-    if "id" not in create_data:
-        print(f"[ERROR] Container creation failed: {create_data}")
-        return None
+    caption = f"{title}\n\n{description}"
+    if IG_UPLOAD_MODE == "resumable" and Path(str(video_url)).is_file():
+        container_id = create_resumable_container(video_url, caption, account, ig_user_id, token, cancel)
+        if not container_id:
+            return None
+    else:
+        create_data = graph_post(
+            f"{ig_user_id}/media",
+            token,
+            media_type="REELS",
+            video_url=video_url,
+            caption=caption
+        ).json()
+        if "id" not in create_data:
+            print(f"[ERROR] Container creation failed: {create_data}")
+            return None
 
-    container_id = create_data["id"]
+        container_id = create_data["id"]
 
     print(f"[INFO] Uploading to IG {account}, waiting for processing...")
-    if not wait_for_media_ready(container_id, token):
+    if not wait_for_media_ready(container_id, token, cancel):
         print("[ERROR] Media processing timed out or failed.")
         return None
 
-    publish = requests.post(
-        f"https://graph.facebook.com/v18.0/{ig_user_id}/media_publish",
-        data={
-            "creation_id": container_id,
-            "access_token": token
-        },
-        timeout=60
-    )
+    # An unpublished container is harmless; a second publish is a duplicate post
+    check_cancelled(cancel, "Instagram")
+    publish = graph_post(f"{ig_user_id}/media_publish", token, creation_id=container_id)
 
     if publish.status_code == 200:
         res_data = publish.json()
         print(f"[SUCCESS] Reels published on Instagram for {account}")
-        update_ig_count(account)
         
         media_id = res_data.get("id")
         ig_link = f"https://www.instagram.com/reels/{media_id}/"
@@ -117,3 +141,12 @@ def upload_instagram(video_url, title, description, account):
     else:
         print(f"[ERROR] Publishing failed: {publish.text}")
         return None
+
+def upload_instagram(video_url, title, description, account, cancel=None):
+    # The daily slot is reserved up front and only counted if the upload succeeds
+    reserved, res = quota.run_reserved(
+        "instagram", account, MAX_DAILY_REELS, _upload_instagram, video_url, title, description, account, cancel
+    )
+    if not reserved:
+        print(f"[SKIP] Instagram {account} has reached daily Reels limit.")
+    return res
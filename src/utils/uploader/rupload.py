@@ -0,0 +1,126 @@
+import os
+import mmap
+import time
+import random
+import requests
+from pathlib import Path
+from dotenv import load_dotenv
+from utils import http_client, progress, metrics
+from utils.uploader.cancel import check_cancelled
+
+load_dotenv()
+
+# Overridable so the uploaders can run against a local fake endpoint
+GRAPH_URL = os.getenv("META_GRAPH_URL", "https://graph.facebook.com/v18.0").rstrip("/")
+RUPLOAD_URL = os.getenv("META_RUPLOAD_URL", "https://rupload.facebook.com").rstrip("/")
+
+RUPLOAD_CHUNK_SIZE = int(os.getenv("RUPLOAD_CHUNK_MB", "8")) * 1024 * 1024
+RUPLOAD_MAX_RETRIES = int(os.getenv("RUPLOAD_MAX_RETRIES", "5"))
+
+
+def rupload_file(upload_url, token, video_path, offset=0, committed_offset=None, on_progress=None, label="Meta", cancel=None):
+    """
+    Send video_path to a Meta rupload endpoint in fixed-size ranges using the
+    `offset` header, starting at offset. Chunks are sliced from a read-only
+    memory map, so only one chunk is ever copied into memory.
+
+    After a failed chunk, committed_offset() (if given) is asked how many
+    bytes the server already has and the upload continues from there.
+    on_progress(offset, size) is called after every chunk. Setting the cancel
+    Event stops the upload before the next chunk with UploadCancelled.
+    Returns the final offset (the file size).
+    """
+    size = Path(video_path).stat().st_size
+    if size == 0:
+        raise ValueError(f"Refusing to upload empty file: {video_path}")
+
+    headers = {
+        "Authorization": f"OAuth {token}",
+        "file_size": str(size),
+        "Content-Type": "application/octet-stream"
+    }
+
+    retries = 0
+    task_cm = progress.track(f"upload:{label.lower()}", f"{label} upload", total=size, unit="B")
+    with task_cm as task, open(video_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        task.update(offset)
+        while offset < size:
+            check_cancelled(cancel, label)
+            end = min(offset + RUPLOAD_CHUNK_SIZE, size)
+            chunk_started = time.monotonic()
+            try:
+                res = http_client.post(
+                    upload_url,
+                    data=mm[offset:end],
+                    headers=dict(headers, offset=str(offset)),
+                    timeout=(10, 120)
+                )
+                res.raise_for_status()
+            except requests.RequestException as e:
+                retries += 1
+                metrics.inc("clip_upload_chunk_retries_total", platform=label.lower())
+                if retries > RUPLOAD_MAX_RETRIES:
+                    raise
+                delay = min(30, 2 ** retries) + random.random()
+                print(f"[WARN] {label} chunk at {offset} failed ({e}), retry {retries}/{RUPLOAD_MAX_RETRIES} in {delay:.0f}s")
+                time.sleep(delay)
+                if committed_offset:
+                    try:
+                        offset = committed_offset()
+                        print(f"[INFO] {label} server has {offset}/{size} bytes, resuming")
+                    except Exception as oe:
+                        print(f"[WARN] Could not read {label} upload offset: {oe}")
+                continue
+
+            retries = 0
+            sent = end - offset
+            offset = end
+            metrics.inc("clip_bytes_uploaded_total", sent, platform=label.lower())
+            elapsed = max(time.monotonic() - chunk_started, 1e-6)
+            print(f"[INFO] {label} upload {offset * 100 // size}% ({sent / elapsed / 1e6:.2f} MB/s)")
+            task.update(offset)
+            if on_progress:
+                on_progress(offset, size)
+
+    return offset
+
+
+def committed_offset(object_id, token):
+    """
+    Bytes of a resumable FB reel upload the server already received, read
+    from the video's status.uploading_phase. Raises ValueError if the status
+    doesn't say.
+    """
+    res = http_client.get(
+        f"{GRAPH_URL}/{object_id}",
+        params={"fields": "status", "access_token": token},
+        timeout=30
+    ).json()
+    status = res.get("status")
+    phase = status.get("uploading_phase", {}) if isinstance(status, dict) else {}
+    if "bytes_transferred" not in phase:
+        raise ValueError(f"No uploading_phase in status of {object_id}: {res}")
+    return int(phase["bytes_transferred"])
+
+
+def rupload_offset(upload_url, token):
+    """
+    Bytes the rupload endpoint already holds for upload_url. IG media
+    containers only report a status string, so their offset is asked here.
+    """
+    res = http_client.get(upload_url, headers={"Authorization": f"OAuth {token}"}, timeout=30)
+    res.raise_for_status()
+    return int(res.json()["offset"])
+
+
+def resume_offset(query, saved, label="Meta"):
+    """
+    Offset to resume an interrupted upload at: query()'s answer from the
+    server, or the offset saved with the session when the server can't say.
+    A wrong saved offset is rejected by the server and corrected on retry.
+    """
+    try:
+        return query()
+    except Exception as e:
+        print(f"[WARN] Could not read {label} upload offset ({e}), using saved offset {saved}")
+        return saved
@@ -0,0 +1,55 @@
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
+DATA_DIR = BASE_DIR / "data"
+SESSIONS_DIR = DATA_DIR / "upload_sessions"
+
+# Resumable sessions older than this are assumed dead on the server side
+SESSION_MAX_AGE = 6 * 3600
+
+
+def session_key(platform, account, video_path):
+    """Identify an upload by platform, account and the exact file being sent."""
+    path = Path(video_path).resolve()
+    st = path.stat()
+    fingerprint = f"{path}|{st.st_size}|{st.st_mtime_ns}"
+    digest = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:16]
+    return f"{platform}_{account}_{digest}"
+
+
+def _session_file(key):
+    return SESSIONS_DIR / f"{key}.json"
+
+
+def load_session(key):
+    try:
+        with open(_session_file(key), "r", encoding="utf-8") as f:
+            session = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if time.time() - session.get("updated", 0) > SESSION_MAX_AGE:
+        clear_session(key)
+        return None
+    return session
+
+
+def save_session(key, data):
+    """Persist resumable-upload state (session URI/id, offset) for retries and restarts."""
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    data = dict(data, updated=time.time())
+    path = _session_file(key)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def clear_session(key):
+    try:
+        _session_file(key).unlink()
+    except FileNotFoundError:
+        pass
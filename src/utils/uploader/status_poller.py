@@ -0,0 +1,172 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+from utils.uploader.graph import client as graph
+from utils.uploader.cancel import check_cancelled
+
+load_dotenv()
+
+# First check soon after the upload, then back off towards POLL_MAX_INTERVAL
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "2"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "15"))
+POLL_BACKOFF = float(os.getenv("POLL_BACKOFF", "1.5"))
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", "300"))
+
+# Graph accepts at most 50 ids in one ?ids= lookup
+MAX_IDS_PER_REQUEST = 50
+# How often a waiter checks its cancel Event
+CANCEL_CHECK_INTERVAL = 1
+
+
+class _Watch:
+    def __init__(self, object_id, token, fields, check, deadline):
+        self.object_id = object_id
+        self.token = token
+        self.fields = fields
+        self.check = check
+        self.deadline = deadline
+        self.interval = POLL_MIN_INTERVAL
+        self.next_due = time.monotonic() + POLL_MIN_INTERVAL
+        self.result = None
+        self.response = None
+        self.done = threading.Event()
+
+
+class StatusPoller:
+    """
+    One background thread that polls every pending Meta container.
+
+    Watches due in the same round that share a token and field list are
+    looked up together with a single GET /?ids=a,b,c lookup, and all of a
+    round's lookups go out as one Graph batch request. Each watch
+    has its own interval that starts at POLL_MIN_INTERVAL and grows by
+    POLL_BACKOFF up to POLL_MAX_INTERVAL, and its waiter is woken as soon
+    as check() decides the container is done.
+    """
+
+    def __init__(self):
+        self._watches = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self.requests_sent = 0
+        self.checks_done = 0
+
+    def wait(self, object_id, token, fields, check, timeout=POLL_TIMEOUT, cancel=None):
+        """
+        Block until check(response) returns True/False for object_id, or
+        until timeout. check returns None while the container is still
+        processing. Returns (result, last_response); result is None on timeout.
+        Raises UploadCancelled if the cancel Event is set while waiting.
+        """
+        watch = _Watch(object_id, token, fields, check, time.monotonic() + timeout)
+        with self._cond:
+            self._watches.append(watch)
+            self._ensure_thread()
+            self._cond.notify()
+        while not watch.done.wait(CANCEL_CHECK_INTERVAL if cancel is not None else None):
+            if cancel.is_set():
+                # The poller drops finished watches on its next round
+                watch.done.set()
+                check_cancelled(cancel, f"Status wait for {object_id}")
+        return watch.result, watch.response
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="status-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._watches = [w for w in self._watches if not w.done.is_set()]
+                while not self._watches:
+                    self._cond.wait()
+                now = time.monotonic()
+                next_due = min(w.next_due for w in self._watches)
+                if next_due > now:
+                    self._cond.wait(next_due - now)
+                    continue
+                due = [w for w in self._watches if w.next_due <= now]
+
+            self._poll(due)
+
+            now = time.monotonic()
+            with self._cond:
+                for w in due:
+                    if not w.done.is_set() and now >= w.deadline:
+                        w.done.set()
+                    if w.done.is_set():
+                        if w in self._watches:
+                            self._watches.remove(w)
+                    else:
+                        w.interval = min(w.interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+                        w.next_due = min(now + w.interval, w.deadline)
+
+    def _poll(self, due):
+        groups = {}
+        for w in due:
+            groups.setdefault((w.token, w.fields), []).append(w)
+        chunks = [
+            (token, fields, watches[i:i + MAX_IDS_PER_REQUEST])
+            for (token, fields), watches in groups.items()
+            for i in range(0, len(watches), MAX_IDS_PER_REQUEST)
+        ]
+
+        try:
+            responses = self._fetch(chunks)
+        except Exception as e:
+            print(f"[WARN] Status poll failed for {len(due)} container(s): {e}")
+            return
+
+        for w in due:
+            res = responses.get((w.token, w.object_id))
+            if res is None:
+                continue
+            self.checks_done += 1
+            w.response = res
+            try:
+                result = w.check(res)
+            except Exception as e:
+                print(f"[WARN] Status check failed for {w.object_id}: {e}")
+                continue
+            if result is not None:
+                w.result = result
+                w.done.set()
+
+    def _fetch(self, chunks):
+        """Look up every chunk in one batch; returns {(token, object_id): response}."""
+        calls = []
+        for token, fields, watches in chunks:
+            ids = [w.object_id for w in watches]
+            if len(ids) == 1:
+                calls.append(("GET", ids[0], token, {"fields": fields}))
+            else:
+                calls.append(("GET", "", token, {"ids": ",".join(ids), "fields": fields}))
+        self.requests_sent += 1
+
+        out = {}
+        retry = []
+        for (token, fields, watches), res in zip(chunks, graph.call_many(calls)):
+            data = res.json()
+            if len(watches) == 1:
+                out[(token, watches[0].object_id)] = data
+            elif "error" in data:
+                # One bad id fails the whole lookup; ask for each id on its own
+                print(f"[WARN] Multi-id status lookup failed, polling {len(watches)} ids one by one: {data['error']}")
+                retry += [("GET", w.object_id, token, {"fields": fields}) for w in watches]
+            else:
+                out.update({(token, object_id): r for object_id, r in data.items()})
+
+        if retry:
+            for (_, object_id, token, _), res in zip(retry, graph.call_many(retry)):
+                out[(token, object_id)] = res.json()
+        return out
+
+
+_poller = StatusPoller()
+
+
+def wait_for_status(object_id, token, fields, check, timeout=POLL_TIMEOUT, cancel=None):
+    """Wait on the shared poller; see StatusPoller.wait."""
+    return _poller.wait(object_id, token, fields, check, timeout, cancel)
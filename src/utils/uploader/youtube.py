@@ -1,50 +1,32 @@
-import json
-from datetime import datetime
+import os
+import time
+import random
 from pathlib import Path
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 from auth.youtube import get_credentials
+from utils import quota, progress, metrics
 from utils.telegram import send_to_telegram
+from utils.uploader.sessions import session_key, load_session, save_session, clear_session
+from utils.uploader.cancel import check_cancelled
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 DATA_DIR = BASE_DIR / "data"
-UPLOAD_LOG = DATA_DIR / "_upload_stats_yt.json"
 MAX_DAILY_UPLOAD = 10 
 
+# Resumable upload: chunk size must be a multiple of 256 KiB
+YT_CHUNK_SIZE = int(os.getenv("YT_CHUNK_MB", "8")) * 1024 * 1024
+YT_MAX_RETRIES = int(os.getenv("YT_MAX_RETRIES", "8"))
+RETRIABLE_STATUS = {500, 502, 503, 504}
+
 def can_upload(account):
-    if not UPLOAD_LOG.exists():
-        return True
-    
-    with open(UPLOAD_LOG, 'r') as f:
-        stats = json.load(f)
-    
-    today = datetime.now().strftime("%Y-%m-%d")
-    acc_stats = stats.get(account, {})
-    
-    if acc_stats.get("date") == today:
-        return acc_stats.get("count", 0) < MAX_DAILY_UPLOAD
-    return True
+    return quota.can_upload("youtube", account, MAX_DAILY_UPLOAD)
 
 def update_upload_count(account):
-    stats = {}
-    if UPLOAD_LOG.exists():
-        with open(UPLOAD_LOG, 'r') as f:
-            stats = json.load(f)
-    
-    today = datetime.now().strftime("%Y-%m-%d")
-    if account not in stats or stats[account].get("date") != today:
-        stats[account] = {"date": today, "count": 1}
-    else:
-        stats[account]["count"] += 1
-        
-    with open(UPLOAD_LOG, 'w') as f:
-        json.dump(stats, f, indent=4)
-
-def upload_youtube(video_path, title, description, account):
-    if not can_upload(account):
-        print(f"[SKIP] Youtube {account} has reached the daily limit.")
-        return None
+    quota.record("youtube", account)
 
+def _upload_youtube(video_path, title, description, account, cancel=None):
     creds = get_credentials(account)
     youtube = build("youtube", "v3", credentials=creds)
 
@@ -64,23 +46,65 @@ def upload_youtube(video_path, title, description, account):
         },
         media_body=MediaFileUpload(
             video_path,
-            chunksize=-1,
+            chunksize=YT_CHUNK_SIZE,
             resumable=True
         )
     )
 
+    key = session_key("youtube", account, video_path)
+    session = load_session(key)
+    if session:
+        print(f"[INFO] Resuming YouTube upload session for {account}")
+        request.resumable_uri = session["uri"]
+        # Makes next_chunk() ask the server for the committed offset first
+        request._in_error_state = True
+
+    # Set when the server dropped the session; the caller must retry with a fresh one
+    expired = False
     try:
         response = None
-        while response is None:
-            status, response = request.next_chunk()
-            if status:
-                print(f"[INFO] Uploading {int(status.progress() * 100)}%")
+        retries = 0
+        size = Path(video_path).stat().st_size
+        with progress.track("upload:youtube", "YouTube upload", total=size, unit="B") as task:
+            while response is None:
+                check_cancelled(cancel, "YouTube")
+                sent_before = request.resumable_progress
+                chunk_started = time.monotonic()
+                try:
+                    status, response = request.next_chunk()
+                except (HttpError, OSError) as e:
+                    code = e.resp.status if isinstance(e, HttpError) else None
+                    if code in (404, 410):
+                        # Session expired on the server; the next attempt starts over
+                        clear_session(key)
+                        expired = True
+                        raise
+                    if code is not None and code not in RETRIABLE_STATUS:
+                        raise
+                    retries += 1
+                    metrics.inc("clip_upload_chunk_retries_total", platform="youtube")
+                    if retries > YT_MAX_RETRIES:
+                        raise
+                    delay = min(64, 2 ** retries) + random.random()
+                    print(f"[WARN] YouTube chunk failed ({code or e}), retry {retries}/{YT_MAX_RETRIES} in {delay:.0f}s")
+                    time.sleep(delay)
+                    request._in_error_state = True
+                    continue
+
+                retries = 0
+                if request.resumable_uri:
+                    save_session(key, {"uri": request.resumable_uri, "offset": request.resumable_progress})
+                task.update(request.resumable_progress)
+                metrics.inc("clip_bytes_uploaded_total", request.resumable_progress - sent_before, platform="youtube")
+                if status:
+                    sent = request.resumable_progress - sent_before
+                    elapsed = max(time.monotonic() - chunk_started, 1e-6)
+                    print(f"[INFO] Uploading {int(status.progress() * 100)}% ({sent / elapsed / 1e6:.2f} MB/s)")
         
+        clear_session(key)
         video_id = response.get("id")
         video_link = f"https://youtu.be/{video_id}"
         
-        update_upload_count(account)
-
         send_to_telegram(
             title=title,
             account=account,
@@ -91,4 +115,17 @@ def upload_youtube(video_path, title, description, account):
         return response
     except Exception as e:
         print(f"[ERROR] Upload failed for {account}: {e}")
+        # Let the caller retry while a resumable session is still on record,
+        # or with a new session when the old one expired
+        if expired or load_session(key):
+            raise
         return None
+
+def upload_youtube(video_path, title, description, account, cancel=None):
+    # The daily slot is reserved up front and only counted if the upload succeeds
+    reserved, res = quota.run_reserved(
+        "youtube", account, MAX_DAILY_UPLOAD, _upload_youtube, video_path, title, description, account, cancel
+    )
+    if not reserved:
+        print(f"[SKIP] Youtube {account} has reached the daily limit.")
+    return res
@@ -1,9 +1,20 @@
-import subprocess
 import os
+import re
+import json
+import time
+import hashlib
+import threading
 import yt_dlp
 import random
+import subprocess
+import numpy as np
 from pathlib import Path
-from .helpers import sanitize_filename
+from dotenv import load_dotenv
+from .helpers import sanitize_filename, to_seconds
+from .ffmpeg_runner import run_ffmpeg, FFMPEG_STALL_TIMEOUT, FFMPEG_TIME_FACTOR
+from . import metrics
+
+load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 DATA_DIR = BASE_DIR / "data"
@@ -11,28 +22,245 @@ BRAINROT_DIR = BASE_DIR / "media" / "brainrot"
 
 COOKIE_FILE = DATA_DIR / "_cookies.txt"
 
-def get_video_info(url, proxy=None):
-    ydl_opts = {
-        'format': 'best[ext=mp4]/best',
-        'quiet': True,
-        'no_warnings': True,
-    }
-    
+# yt-dlp extraction cache: entries live until the signed stream URL expires
+YTDLP_CACHE_FILE = DATA_DIR / "_ytdlp_cache.json"
+YTDLP_CACHE_TTL = int(os.getenv("YTDLP_CACHE_TTL", "3600"))  # when the URL has no expire param
+YTDLP_EXPIRE_MARGIN = 600
+FORMAT_FIELDS = ("format_id", "ext", "width", "height", "fps", "vcodec", "acodec", "tbr", "url")
+
+_ydl_instances = {}
+_ydl_lock = threading.Lock()
+
+# Extra seconds fetched before/after the clip so the stream copy can start on a keyframe
+SEGMENT_PAD = float(os.getenv("SEGMENT_PAD", "5"))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+def network_input_opts(proxy=None):
+    """FFmpeg input options for reading a remote stream."""
+    cmd = []
     if proxy:
-        ydl_opts['proxy'] = proxy
+        cmd += ["-http_proxy", proxy]
+    cmd += ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5", "-headers", f"User-Agent: {USER_AGENT}\r\n"]
+    return cmd
 
-    if COOKIE_FILE.exists():
-        ydl_opts['cookiefile'] = str(COOKIE_FILE)
+def _cookie_identity():
+    if not COOKIE_FILE.exists():
+        return ""
+    st = COOKIE_FILE.stat()
+    return f"{st.st_mtime_ns}:{st.st_size}"
 
+def _stream_expiry(stream_url):
+    """Unix time at which a signed googlevideo URL stops working, if it says."""
+    match = re.search(r"[?&/]expire[=/](\d+)", stream_url or "")
+    return int(match.group(1)) if match else None
+
+def _load_info_cache():
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            return sanitize_filename(info.get('title', 'video')), info.get('url')
+        with open(YTDLP_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_info_cache(cache):
+    now = time.time()
+    cache = {k: v for k, v in cache.items() if v.get("expires", 0) > now}
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = YTDLP_CACHE_FILE.with_name(f"{YTDLP_CACHE_FILE.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp, YTDLP_CACHE_FILE)
+
+def _get_ydl(proxy):
+    """Warm YoutubeDL instance per (proxy, cookie file) pair, reused across jobs."""
+    key = (proxy or "", _cookie_identity())
+    if key not in _ydl_instances:
+        ydl_opts = {
+            'format': 'best[ext=mp4]/best',
+            'quiet': True,
+            'no_warnings': True,
+        }
+        if proxy:
+            ydl_opts['proxy'] = proxy
+        if COOKIE_FILE.exists():
+            ydl_opts['cookiefile'] = str(COOKIE_FILE)
+        _ydl_instances[key] = yt_dlp.YoutubeDL(ydl_opts)
+    return _ydl_instances[key]
+
+def _info_key(url, proxy):
+    return hashlib.sha1(f"{url}|{proxy or ''}|{_cookie_identity()}".encode("utf-8")).hexdigest()
+
+def extract_info_cached(url, proxy=None):
+    """
+    Return {"title", "url", "formats", "expires"} for a video, from the on-disk
+    cache while the signed stream URL is still valid, else via yt-dlp.
+    """
+    key = _info_key(url, proxy)
+
+    with _ydl_lock:
+        entry = _load_info_cache().get(key)
+        if entry and entry["expires"] > time.time():
+            return entry
+
+        info = _get_ydl(proxy).extract_info(url, download=False)
+        stream_url = info.get('url')
+        expire = _stream_expiry(stream_url)
+        expires = (expire - YTDLP_EXPIRE_MARGIN) if expire else time.time() + YTDLP_CACHE_TTL
+
+        entry = {
+            "title": info.get('title', 'video'),
+            "url": stream_url,
+            "formats": [
+                {k: f.get(k) for k in FORMAT_FIELDS}
+                for f in info.get('formats') or []
+            ],
+            "expires": expires
+        }
+        cache = _load_info_cache()
+        cache[key] = entry
+        _save_info_cache(cache)
+        return entry
+
+def invalidate_info(url, proxy=None):
+    """
+    Drop a cached extraction whose stream URL was rejected (403, an IP-bound
+    URL after a proxy change, a revoked signature) so the next call re-extracts.
+    """
+    key = _info_key(url, proxy)
+    with _ydl_lock:
+        cache = _load_info_cache()
+        if cache.pop(key, None) is not None:
+            _save_info_cache(cache)
+
+def get_video_info(url, proxy=None):
+    try:
+        info = extract_info_cached(url, proxy=proxy)
+        return sanitize_filename(info['title']), info['url']
     except Exception as e:
         print(f"[ERROR] Extraction failed: {e}")
         return None, None
 
-def process_video(args, video_source, final_output_path, ass_file=None):
+def load_audio_pcm(video_source, start, end, sample_rate=16000, on_progress=None):
+    """
+    Decode [start, end] of a source to mono float32 PCM in memory (the format
+    WhisperModel.transcribe takes directly), read from ffmpeg's stdout.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error",
+        "-ss", str(start), "-to", str(end), "-i", str(video_source),
+        "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"
+    ]
+    out = run_ffmpeg(
+        cmd, duration=to_seconds(end) - to_seconds(start), label="audio decode",
+        capture_stdout=True, on_progress=on_progress
+    )
+    return np.frombuffer(out, dtype=np.int16).astype(np.float32) / 32768.0
+
+def segment_range(start, end, pad=SEGMENT_PAD):
+    """Return (fetch_start, fetch_end) of the padded segment for a clip."""
+    start_s, end_s = to_seconds(start), to_seconds(end)
+    return max(0.0, start_s - pad), end_s + pad
+
+def media_start_time(path):
+    """
+    Start time of a local file in seconds, the point ffmpeg measures input
+    -ss/-to from. Segments keep source timestamps, so this is the source
+    time of their first (key)frame.
+    """
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=start_time",
+         "-of", "default=noprint_wrappers=1:nokey=1", str(path)],
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+    try:
+        return float(out)
+    except ValueError:
+        return 0.0
+
+def clip_range_in_segment(start, end, segment_start):
+    """
+    Return (start, end) of the clip relative to the beginning of its fetched
+    segment, given the segment's measured start (media_start_time).
+    """
+    return to_seconds(start) - segment_start, to_seconds(end) - segment_start
+
+def fetch_segment(video_source, start, end, dest, proxy=None, pad=SEGMENT_PAD, on_progress=None):
+    """
+    Download only [start - pad, end + pad] of a remote stream to dest (stream copy).
+    Skipped if dest already exists, so retries never touch the network.
+
+    A stream-copy seek starts at the keyframe before fetch_start, so the
+    segment keeps source timestamps (-copyts) and callers locate clips in it
+    with media_start_time rather than assuming it begins at fetch_start.
+    """
+    dest = Path(dest)
+    if dest.exists():
+        return dest
+
+    fetch_start, fetch_end = segment_range(start, end, pad)
+    part = dest.with_name(dest.name + ".part")
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+    cmd += network_input_opts(proxy)
+    cmd += [
+        "-ss", f"{fetch_start:.3f}", "-to", f"{fetch_end:.3f}", "-i", str(video_source),
+        "-copyts", "-map", "0:v:0?", "-map", "0:a:0?", "-c", "copy",
+        "-f", "matroska", str(part)
+    ]
+    # With -copyts out_time is a source timestamp; report it from fetch_start
+    run_ffmpeg(
+        cmd, duration=fetch_end - fetch_start, label="segment fetch",
+        on_progress=(lambda t, total: on_progress(max(0.0, t - fetch_start), total)) if on_progress else None
+    )
+    metrics.inc("clip_bytes_downloaded_total", part.stat().st_size)
+    part.replace(dest)
+    return dest
+
+TARGET_H = 1350
+TARGET_W = 760
+BRAINROT_W, BRAINROT_H = 1080, 960
+
+ENCODE_OPTS = [
+    "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+    "-c:a", "aac", "-b:a", "192k", "-avoid_negative_ts", "make_zero",
+]
+
+def subtitles_filter(ass_file):
+    abs_ass = Path(ass_file).absolute().as_posix().replace(":", "\\:")
+    return f"subtitles='{abs_ass}'"
+
+def pick_brainrot_clip():
+    clip_files = list(BRAINROT_DIR.glob("*.mp4"))
+    if not clip_files:
+        raise FileNotFoundError(f"No brainrot clips found in: {BRAINROT_DIR.absolute()}")
+    return str(random.choice(clip_files))
+
+def brainrot_filters(ass_file=None):
+    """Return (top, bottom) filter chains for the stacked brainrot layout."""
+    bw, bh = BRAINROT_W, BRAINROT_H
+    top_filter = f"scale={bw}:{bh}:force_original_aspect_ratio=increase,crop={bw}:{bh},setsar=1"
+    if ass_file:
+        top_filter += f",{subtitles_filter(ass_file)}"
+    bottom_filter = f"scale={bw}:{bh}:force_original_aspect_ratio=increase,crop={bw}:{bh},setsar=1"
+    return top_filter, bottom_filter
+
+def standard_filters(args, ass_file=None):
+    """Filter chain for the regular vertical (cropped or padded) layout."""
+    crop_x_map = {"l": "0", "r": "iw/2", "c": "iw/4"}
+    crop_x = crop_x_map.get(args.position, "iw/4")
+    
+    filters = ["format=yuv420p"]
+    if args.crop:
+        filters.insert(0, f"scale=-1:{TARGET_H}")
+        filters.append(f"crop='if(gt(iw,ih),iw/2,iw)':{TARGET_H}:{crop_x}:0")
+    else:
+        filters.insert(0, f"scale={TARGET_W}:-1")
+        filters.append(f"pad={TARGET_W}:{TARGET_H}:(ow-iw)/2:(oh-ih)/2")
+
+    if ass_file:
+        filters.append(subtitles_filter(ass_file))
+    return filters
+
+def process_video(args, video_source, final_output_path, ass_file=None, on_progress=None):
     # Get proxy from args
     proxy = getattr(args, 'proxy', None)
 
@@ -53,31 +281,11 @@ def process_video(args, video_source, final_output_path, ass_file=None):
     
     # Network options for URL source
     if str(video_source).startswith("http"):
-        ua = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        
-        # Add proxy to FFmpeg if provided
-        if proxy:
-            cmd += ["-http_proxy", proxy]
-            
-        cmd += ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5", "-headers", f"User-Agent: {ua}\r\n"]
+        cmd += network_input_opts(proxy)
 
-    target_h = 1350
-    target_w = 760
-    
     if getattr(args, 'brainrot', False):
-        clip_files = list(BRAINROT_DIR.glob("*.mp4"))
-        if not clip_files:
-            raise FileNotFoundError(f"No brainrot clips found in: {BRAINROT_DIR.absolute()}")
-        
-        random_clip = str(random.choice(clip_files))
-        bw, bh = 1080, 960 
-        
-        top_filter = f"scale={bw}:{bh}:force_original_aspect_ratio=increase,crop={bw}:{bh},setsar=1"
-        if ass_file:
-            abs_ass = Path(ass_file).absolute().as_posix().replace(":", "\\:")
-            top_filter += f",subtitles='{abs_ass}'"
-        
-        bottom_filter = f"scale={bw}:{bh}:force_original_aspect_ratio=increase,crop={bw}:{bh},setsar=1"
+        random_clip = pick_brainrot_clip()
+        top_filter, bottom_filter = brainrot_filters(ass_file)
 
         filter_complex = (
             f"[0:v]{top_filter}[top];"
@@ -92,32 +300,82 @@ def process_video(args, video_source, final_output_path, ass_file=None):
             "-map", "0:a", "-shortest"
         ]
     else:
-        crop_x_map = {"l": "0", "r": "iw/2", "c": "iw/4"}
-        crop_x = crop_x_map.get(args.position, "iw/4")
-        
-        filters = ["format=yuv420p"]
-        if args.crop:
-            filters.insert(0, f"scale=-1:{target_h}")
-            filters.append(f"crop='if(gt(iw,ih),iw/2,iw)':{target_h}:{crop_x}:0")
-        else:
-            filters.insert(0, f"scale={target_w}:-1")
-            filters.append(f"pad={target_w}:{target_h}:(ow-iw)/2:(oh-ih)/2")
-
-        if ass_file:
-            abs_ass = Path(ass_file).absolute().as_posix().replace(":", "\\:")
-            filters.append(f"subtitles='{abs_ass}'")
-
         cmd += [
             "-ss", str(args.start), "-to", str(args.end), "-i", str(video_source),
-            "-vf", ",".join(filters)
+            "-vf", ",".join(standard_filters(args, ass_file))
         ]
 
     # 3. Common Encoding Settings
-    cmd += [
-        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
-        "-c:a", "aac", "-b:a", "192k", "-avoid_negative_ts", "make_zero",
-        str(final_output_path)
-    ]
+    cmd += ENCODE_OPTS + [str(final_output_path)]
 
-    subprocess.run(cmd, check=True)
+    run_ffmpeg(
+        cmd, duration=to_seconds(args.end) - to_seconds(args.start), label="render", on_progress=on_progress
+    )
     return video_title
+
+def process_video_group(entries, video_source, proxy=None, on_progress=None):
+    """
+    Render several clips of one source in a single ffmpeg run.
+
+    entries: list of (clip_args, output_path, ass_file); each clip_args carries
+    its own start/end/position/crop/brainrot. The source is decoded once over
+    the union of the clip ranges and split into one filter chain per output.
+
+    ffmpeg reports the furthest output's time, which runs up to the longest
+    clip; on_progress(seconds, longest) is scaled to that.
+    """
+    starts = [to_seconds(a.start) for a, _, _ in entries]
+    ends = [to_seconds(a.end) for a, _, _ in entries]
+    span_start, span_end = min(starts), max(ends)
+    n = len(entries)
+
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+    if str(video_source).startswith("http"):
+        cmd += network_input_opts(proxy)
+    cmd += ["-ss", f"{span_start:.3f}", "-to", f"{span_end:.3f}", "-i", str(video_source)]
+
+    graph = [
+        f"[0:v]split={n}" + "".join(f"[s{i}]" for i in range(n)),
+        f"[0:a]asplit={n}" + "".join(f"[sa{i}]" for i in range(n)),
+    ]
+    outputs = []
+    next_input = 1
+
+    for i, (args, out_path, ass_file) in enumerate(entries):
+        rel_start = starts[i] - span_start
+        rel_end = ends[i] - span_start
+        trim = f"trim=start={rel_start:.3f}:end={rel_end:.3f},setpts=PTS-STARTPTS"
+        graph.append(f"[sa{i}]atrim=start={rel_start:.3f}:end={rel_end:.3f},asetpts=PTS-STARTPTS[a{i}]")
+
+        out_opts = []
+        if getattr(args, 'brainrot', False):
+            cmd += ["-stream_loop", "-1", "-i", pick_brainrot_clip()]
+            top_filter, bottom_filter = brainrot_filters(ass_file)
+            graph.append(f"[s{i}]{trim},{top_filter}[top{i}]")
+            graph.append(f"[{next_input}:v]{bottom_filter}[bottom{i}]")
+            graph.append(f"[top{i}][bottom{i}]vstack=inputs=2,format=yuv420p[v{i}]")
+            out_opts.append("-shortest")
+            next_input += 1
+        else:
+            graph.append(f"[s{i}]{trim},{','.join(standard_filters(args, ass_file))}[v{i}]")
+
+        outputs += ["-map", f"[v{i}]", "-map", f"[a{i}]"] + out_opts + ENCODE_OPTS + [str(out_path)]
+
+    cmd += ["-filter_complex", ";".join(graph)] + outputs
+
+    # Reported time is the furthest output's, so it holds still while ffmpeg
+    # decodes the gap before a clip and while it encodes a clip shorter than
+    # an earlier one; let the watchdog wait out the worst such stretch
+    longest = max(e - s for s, e in zip(starts, ends))
+    max_gap, covered = 0.0, span_start
+    for s, e in sorted(zip(starts, ends)):
+        max_gap = max(max_gap, s - covered)
+        covered = max(covered, e)
+    stall_timeout = FFMPEG_STALL_TIMEOUT + FFMPEG_TIME_FACTOR * (max_gap + longest)
+
+    # Every output is encoded, so budget for the clips' total length
+    run_ffmpeg(
+        cmd, duration=sum(e - s for s, e in zip(starts, ends)), label=f"group render ({n} clips)",
+        on_progress=(lambda t, _: on_progress(t, longest)) if on_progress else None,
+        stall_timeout=stall_timeout
+    )
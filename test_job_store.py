@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Checks for the SQLite job store: _jobs.json import, web manager saves and
+slot date normalization.
+Runs against a throwaway database in a temp directory.
+Usage: python3 test_job_store.py
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+TMP_DIR = Path(tempfile.mkdtemp(prefix="clip-jobs-test-"))
+# job_store reads its database path at import time
+os.environ["JOBS_DB"] = str(TMP_DIR / "jobs.db")
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+
+from utils import job_store
+
+results = []
+
+
+def check(name, success, message=""):
+    status = "✅ PASS" if success else "❌ FAIL"
+    results.append(success)
+    print(f"{status} {name}")
+    if message:
+        print(f"    {message}")
+
+
+def write_jobs(path, schedule):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(schedule, f)
+
+
+def status_of(date):
+    return {s["date"]: s["status"] for s in job_store.list_slots()}.get(date)
+
+
+def test_import():
+    jobs = TMP_DIR / "_jobs.json"
+    slot = {"date": "2026-10-17,09:05", "items": [{"title": "Clip"}], "note": "kept"}
+    write_jobs(jobs, [slot])
+
+    job_store.import_json(jobs)
+    job_store.import_json(jobs)
+    slots = job_store.list_slots()
+    check("importing _jobs.json twice keeps one slot", len(slots) == 1, f"slots={slots}")
+    check("extra slot fields survive the import", slots and slots[0].get("note") == "kept")
+
+    job_store.set_status(slot["date"], "completed")
+    job_store.import_json(jobs)
+    check("re-importing an unchanged slot keeps it completed", status_of(slot["date"]) == "completed")
+
+    slot["items"].append({"title": "Another clip"})
+    write_jobs(jobs, [slot])
+    job_store.import_json(jobs)
+    check("a slot whose items changed is queued again", status_of(slot["date"]) == "pending")
+
+    check("sync_json() skips a file it already imported", job_store.sync_json(jobs) is False)
+
+
+def test_replace_all():
+    done = {"date": "2026-10-18,10:00", "status": "pending", "items": [{"title": "Done"}]}
+    todo = {"date": "2026-10-18,11:00", "status": "pending", "items": [{"title": "Todo"}]}
+    job_store.replace_all([done, todo])
+    job_store.set_status(done["date"], "completed")
+
+    # A browser tab loaded before the runner finished the slot still says pending
+    job_store.replace_all([done, todo])
+    check("a stale save keeps an executed slot completed", status_of(done["date"]) == "completed")
+    check("a save keeps pending slots pending", status_of(todo["date"]) == "pending")
+
+    edited = dict(done, items=[{"title": "Done, then edited"}])
+    job_store.replace_all([edited, todo])
+    check("a save that changes an executed slot's items queues it again", status_of(done["date"]) == "pending")
+
+    job_store.replace_all([todo])
+    check("a save removes slots left out of it", status_of(done["date"]) is None)
+
+
+def test_date_normalization():
+    job_store.replace_all([{"date": "2026-10-19,9:05", "items": [{"title": "Unpadded"}]}])
+    slots = job_store.list_slots()
+    check("saved dates are zero-padded", [s["date"] for s in slots] == ["2026-10-19,09:05"], f"slots={slots}")
+    check("an unpadded slot is due at its time", len(job_store.due_slots("2026-10-19,09:05")) == 1)
+    check("an unpadded slot is not due before its time", job_store.due_slots("2026-10-19,09:04") == [])
+
+    job_store.set_status("2026-10-19,9:05", "completed")
+    check("set_status() finds the slot by an unpadded date", status_of("2026-10-19,09:05") == "completed")
+
+    # A row written before dates were normalized
+    job_store._connect().execute(
+        "INSERT INTO slots (date, status, items, updated) VALUES ('2026-10-20,7:30', 'pending', '[]', 0)"
+    )
+    job_store._normalize_stored_dates(job_store._connect())
+    check("legacy unpadded rows are rewritten", status_of("2026-10-20,07:30") == "pending")
+
+
+def main():
+    print("🧪 Job store checks")
+    print("=" * 40)
+    print(f"📁 Database in {TMP_DIR}")
+    print()
+
+    for test in (test_import, test_replace_all, test_date_normalization):
+        try:
+            test()
+        except Exception as e:
+            check(test.__name__, False, f"raised {type(e).__name__}: {e}")
+
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+    passed = sum(results)
+    print()
+    print(f"📊 {passed}/{len(results)} checks passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
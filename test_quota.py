@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Checks for the upload quota ledger: reservations, expiry and legacy import.
+Runs against a throwaway database in a temp directory; no accounts needed.
+Usage: python3 test_quota.py
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+TMP_DIR = Path(tempfile.mkdtemp(prefix="clip-quota-test-"))
+# quota reads its database path at import time
+os.environ["QUOTA_DB"] = str(TMP_DIR / "quota.db")
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+
+from utils import quota
+
+results = []
+
+
+def check(name, success, message=""):
+    status = "✅ PASS" if success else "❌ FAIL"
+    results.append(success)
+    print(f"{status} {name}")
+    if message:
+        print(f"    {message}")
+
+
+def test_concurrent_reserve():
+    """More threads than slots race for the limit; exactly limit of them get one."""
+    limit, workers = 5, 20
+    got = []
+    got_lock = threading.Lock()
+    start = threading.Barrier(workers)
+
+    def worker():
+        start.wait()
+        rid = quota.reserve("youtube", "race", limit)
+        with got_lock:
+            got.append(rid)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    granted = [rid for rid in got if rid]
+    committed, reserved = quota.usage("youtube", "race", fresh=True)
+    check("concurrent reserve() stops at the limit", len(granted) == limit and reserved == limit,
+          f"granted={len(granted)} reserved={reserved} limit={limit}")
+    check("concurrent reserve() hands out distinct ids", len(set(granted)) == len(granted))
+    for rid in granted:
+        quota.rollback(rid)
+
+
+def test_commit_and_rollback():
+    limit = 2
+    first = quota.reserve("facebook", "acc", limit)
+    second = quota.reserve("facebook", "acc", limit)
+    check("reserve() refuses once the limit is reserved", quota.reserve("facebook", "acc", limit) is None)
+
+    quota.rollback(second)
+    check("rollback() frees the slot", quota.usage("facebook", "acc", fresh=True) == (0, 1))
+
+    quota.commit(first)
+    check("commit() counts the upload", quota.usage("facebook", "acc", fresh=True) == (1, 0))
+
+    quota.rollback(second)
+    quota.commit(first)
+    check("settling a reservation twice changes nothing", quota.usage("facebook", "acc", fresh=True) == (1, 0))
+
+    third = quota.reserve("facebook", "acc", limit)
+    check("a committed upload still counts toward the limit",
+          third is not None and quota.reserve("facebook", "acc", limit) is None)
+    quota.rollback(third)
+
+
+def test_run_reserved():
+    def failing():
+        raise RuntimeError("upload failed")
+
+    try:
+        quota.run_reserved("instagram", "acc", 1, failing)
+    except RuntimeError:
+        pass
+    check("run_reserved() gives the slot back when the upload raises",
+          quota.usage("instagram", "acc", fresh=True) == (0, 0))
+
+    reserved, res = quota.run_reserved("instagram", "acc", 1, lambda: None)
+    check("run_reserved() gives the slot back when the upload returns nothing",
+          reserved and res is None and quota.usage("instagram", "acc", fresh=True) == (0, 0))
+
+    reserved, res = quota.run_reserved("instagram", "acc", 1, lambda: "media-id")
+    check("run_reserved() commits a successful upload",
+          reserved and res == "media-id" and quota.usage("instagram", "acc", fresh=True) == (1, 0))
+
+    reserved, res = quota.run_reserved("instagram", "acc", 1, lambda: "media-id")
+    check("run_reserved() skips the upload at the limit", not reserved and res is None)
+
+
+def test_stale_reservation_expiry():
+    rid = quota.reserve("youtube", "crashed", 1)
+    check("reserve() refuses while the reservation is live", quota.reserve("youtube", "crashed", 1) is None)
+
+    # Pretend the process holding it died long ago
+    quota._connect().execute(
+        "UPDATE reservations SET created = ? WHERE id = ?",
+        (time.time() - quota.QUOTA_RESERVATION_TTL - 1, rid)
+    )
+    fresh = quota.reserve("youtube", "crashed", 1)
+    check("a stale reservation is released", fresh is not None,
+          f"usage={quota.usage('youtube', 'crashed', fresh=True)}")
+
+    quota.commit(rid, "youtube", "crashed")
+    quota.rollback(fresh)
+    check("a late success of an expired reservation still counts",
+          quota.usage("youtube", "crashed", fresh=True) == (1, 0))
+
+
+def test_legacy_import():
+    day = quota.today()
+    legacy = TMP_DIR / "_upload_stats_yt.json"
+    with open(legacy, "w") as f:
+        json.dump({"old": {"date": day, "count": 3}, "undated": {"count": 9}}, f)
+    quota.LEGACY_STATS = {"youtube": legacy}
+
+    conn = quota._connect()
+    # The ledger was created before the file existed; start over as a fresh install would
+    conn.execute("DELETE FROM meta WHERE key = 'legacy_imported'")
+    quota.import_legacy_stats(conn)
+    check("legacy stats are imported", quota.usage("youtube", "old", fresh=True) == (3, 0))
+    check("legacy entries without a date are skipped", quota.usage("youtube", "undated", fresh=True) == (0, 0))
+
+    quota.import_legacy_stats(conn)
+    check("importing legacy stats again does not double them", quota.usage("youtube", "old", fresh=True) == (3, 0))
+
+    conn.execute("DELETE FROM meta WHERE key = 'legacy_imported'")
+    quota.import_legacy_stats(conn)
+    check("a repeated import keeps the higher count, never adds", quota.usage("youtube", "old", fresh=True) == (3, 0))
+
+
+def main():
+    print("🧪 Quota ledger checks")
+    print("=" * 40)
+    print(f"📁 Database in {TMP_DIR}")
+    print()
+
+    for test in (test_concurrent_reserve, test_commit_and_rollback, test_run_reserved,
+                 test_stale_reservation_expiry, test_legacy_import):
+        try:
+            test()
+        except Exception as e:
+            check(test.__name__, False, f"raised {type(e).__name__}: {e}")
+
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+    passed = sum(results)
+    print()
+    print(f"📊 {passed}/{len(results)} checks passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
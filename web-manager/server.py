@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 """
-Simple HTTP server for managing _jobs.json file.
-This server allows the web interface to read and write the _jobs.json file.
+Simple HTTP server for managing scheduled jobs.
+This server allows the web interface to read and write the job store
+(data/jobs.db); _jobs.json is still imported when it changes.
 """
 
 import json
 import os
 import sys
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import pathlib
 import random
@@ -17,6 +19,9 @@ PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
 JOBS_FILE = DATA_DIR / "_jobs.json"
 
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+from utils import job_store, progress, metrics
+
 # Ensure data directory exists
 DATA_DIR.mkdir(exist_ok=True)
 
@@ -28,9 +33,15 @@ class JobsRequestHandler(SimpleHTTPRequestHandler):
         parsed_path = urlparse(self.path)
         
         if parsed_path.path == '/api/jobs':
-            self.serve_jobs_file()
+            self.serve_jobs_file(parse_qs(parsed_path.query))
         elif parsed_path.path == '/api/accounts':
             self.serve_accounts()
+        elif parsed_path.path == '/metrics':
+            self.serve_metrics()
+        elif parsed_path.path == '/api/progress':
+            self.serve_progress()
+        elif parsed_path.path == '/api/progress/stream':
+            self.stream_progress()
         else:
             super().do_GET()
     
@@ -50,13 +61,11 @@ class JobsRequestHandler(SimpleHTTPRequestHandler):
         else:
             self.send_error(404, "File not found")
     
-    def serve_jobs_file(self):
+    def serve_jobs_file(self, query):
         try:
-            if JOBS_FILE.exists():
-                with open(JOBS_FILE, 'r', encoding='utf-8') as f:
-                    jobs_data = json.load(f)
-            else:
-                jobs_data = []
+            job_store.sync_json(JOBS_FILE)
+            include_archived = query.get('archived', ['0'])[0] == '1'
+            jobs_data = job_store.list_slots(include_archived)
             
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
@@ -68,7 +77,45 @@ class JobsRequestHandler(SimpleHTTPRequestHandler):
             self.send_response(500)
             self.send_header('Content-Type', 'text/plain')
             self.end_headers()
-            self.wfile.write(f"Error reading jobs file: {str(e)}".encode('utf-8'))
+            self.wfile.write(f"Error reading jobs: {str(e)}".encode('utf-8'))
+    
+    def serve_metrics(self):
+        try:
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.end_headers()
+            self.wfile.write(body)
+        except Exception as e:
+            self.send_response(500)
+            self.send_header('Content-Type', 'text/plain')
+            self.end_headers()
+            self.wfile.write(f"Error collecting metrics: {str(e)}".encode('utf-8'))
+    
+    def serve_progress(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(progress.read_snapshots()).encode('utf-8'))
+    
+    def stream_progress(self):
+        """Server-sent events: the progress of every running process, once per interval"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        
+        try:
+            while True:
+                data = json.dumps(progress.read_snapshots())
+                self.wfile.write(f"data: {data}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(progress.PROGRESS_INTERVAL)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away
+            pass
     
     def serve_accounts(self):
         try:
@@ -214,16 +261,13 @@ class JobsRequestHandler(SimpleHTTPRequestHandler):
             # Validate JSON before saving
             jobs_data = json.loads(post_data.decode('utf-8'))
             
-            # Create backup
-            if JOBS_FILE.exists():
-                backup_file = JOBS_FILE.with_suffix('.json.bak')
-                with open(JOBS_FILE, 'r', encoding='utf-8') as original:
-                    with open(backup_file, 'w', encoding='utf-8') as backup:
-                        backup.write(original.read())
+            # Create backup of the schedule being replaced
+            backup_file = JOBS_FILE.with_suffix('.json.bak')
+            with open(backup_file, 'w', encoding='utf-8') as backup:
+                json.dump(job_store.list_slots(), backup, indent=2, ensure_ascii=False)
             
-            # Save new data
-            with open(JOBS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(jobs_data, f, indent=2, ensure_ascii=False)
+            # One transaction: unchanged slots keep their rows, removed ones are deleted
+            job_store.replace_all(jobs_data)
             
             self.send_response(200)
             self.send_header('Content-Type', 'text/plain')
@@ -231,7 +275,7 @@ class JobsRequestHandler(SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(b"Jobs saved successfully")
             
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, ValueError, TypeError, AttributeError) as e:
             self.send_response(400)
             self.send_header('Content-Type', 'text/plain')
             self.end_headers()
@@ -241,7 +285,7 @@ class JobsRequestHandler(SimpleHTTPRequestHandler):
             self.send_response(500)
             self.send_header('Content-Type', 'text/plain')
             self.end_headers()
-            self.wfile.write(f"Error saving jobs file: {str(e)}".encode('utf-8'))
+            self.wfile.write(f"Error saving jobs: {str(e)}".encode('utf-8'))
     
     def do_OPTIONS(self):
         self.send_response(200)
@@ -255,14 +299,15 @@ def main():
     
     print(f"🚀 Starting Jobs Manager Web Server")
     print(f"📁 Project Root: {PROJECT_ROOT}")
-    print(f"📄 Jobs File: {JOBS_FILE}")
+    print(f"📄 Job Store: {job_store.JOBS_DB}")
     print(f"🌐 Server: http://localhost:{port}")
     print()
     print("Press Ctrl+C to stop the server")
     print()
     
     try:
-        server = HTTPServer(('localhost', port), JobsRequestHandler)
+        # Threaded so open progress streams don't block other requests
+        server = ThreadingHTTPServer(('localhost', port), JobsRequestHandler)
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n🛑 Server stopped")